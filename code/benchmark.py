@@ -0,0 +1,378 @@
+"""This script implements a benchmark for the index extraction. The bundled tesseract data frames and pdfs
+are extracted one after another, the wall time, peak memory and rows per second of every stage of the
+extraction are measured and the extracted indexes are compared to reference outputs. extract.clean_text is
+also compared to the original row by row implementation on the texts of the reference outputs."""
+
+import argparse
+import collections
+import datetime
+import functools
+import io
+import json
+import multiprocessing
+import os
+import platform
+import re
+import sys
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError: # not available on windows
+    resource = None
+
+import util
+import extract
+import profiling
+
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(CODE_DIR)
+
+# stages of the extraction reported by profiling.run_stage, grouped into the stages of the benchmark
+STAGES = {
+    "load": ["read_tess_df", "ocr", "filter_tess_df", "read_pdf"],
+    "lines": ["make_lines_df_from_ocr", "make_words_df", "merge_close_lines", "remove_useless_lines"],
+    "grouping": ["group_line_starts_ends", "make_borders_df", "is_double_paged", "get_mean_dx"],
+    "labeling": ["assign_types", "assign_labels", "correct_x0_types", "approve_correction", "improve_country_classification"],
+    "records": ["extract_records"],
+    "dates": ["extract_dates"],
+    "clean": ["clean_text"]
+}
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of the current process.
+
+    Returns
+    -------
+        peak resident set size in MiB, None if it cannot be determined on this platform
+    """
+    peak = profiling.process_peak_rss_mb() # ru_maxrss does not include the peaks before the resets of the stage measurements
+    if peak != None:
+        return round(peak, 1)
+
+    if resource == None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin": # bytes on macOS, KiB on linux
+        rss = rss / 1024
+
+    return round(rss / 1024, 1)
+
+
+def stage_results(collector, wall_time):
+    """Sums up the measurements of the extraction stages for every stage of the benchmark.
+
+    The rows of a stage are the rows passed to it or, if no data frame is passed, the rows returned by it.
+    The time not spent in any stage is reported as other.
+
+    Parameters
+    ----------
+    collector
+        profiling.StageCollector used for the extraction of a file
+    wall_time
+        wall time of the extraction
+
+    Returns
+    -------
+        dict with time, rows, calls, rows per second, memory change and peak memory of every stage
+    """
+    df = collector.to_frame()
+    df["rows"] = df["rows_in"].fillna(df["rows_out"]).fillna(0)
+
+    results = {}
+    for stage, names in STAGES.items():
+        d = df.loc[df["stage"].isin(names)]
+        t = d["duration"].sum()
+        results[stage] = {
+            "time": round(t, 4),
+            "rows": int(d["rows"].sum()),
+            "calls": d.shape[0],
+            "rows_per_s": round(d["rows"].sum() / t, 1) if t > 0 else None,
+            "memory_delta_mb": round(d["memory_delta_mb"].sum(), 1) if d["memory_delta_mb"].notna().any() else None,
+            "peak_rss_mb": round(d["peak_rss_mb"].max(), 1) if d["peak_rss_mb"].notna().any() else None
+        }
+
+    results["other"] = {"time": round(wall_time - df["duration"].sum(), 4)}
+
+    return results
+
+
+def reference_path(path, mode, reference_dir):
+    """Returns the path of the reference output of a file, named like the outputs of extract_indexes_file."""
+    f_name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(reference_dir, f_name + "_" + mode + ".csv")
+
+
+def compare_to_reference(output, ref_path):
+    """Compares an extracted index to its reference output.
+
+    Parameters
+    ----------
+    output
+        csv text of the extracted index
+    ref_path
+        path to the reference csv file
+
+    Returns
+    -------
+        dict with: identical (True if the csv texts are identical), rows of the reference,
+        matching_rows (quantity of rows that are also in the reference), None if there is no reference
+    """
+    if not os.path.isfile(ref_path):
+        return None
+
+    with open(ref_path, encoding="utf-8", newline="") as f:
+        ref = f.read()
+
+    read = functools.partial(pd.read_csv, dtype=str, keep_default_na=False)
+    ref_rows = collections.Counter(read(io.StringIO(ref)).itertuples(index=False, name=None))
+    out_rows = collections.Counter(read(io.StringIO(output)).itertuples(index=False, name=None))
+
+    return {
+        "path": ref_path,
+        "identical": output == ref,
+        "ref_rows": sum(ref_rows.values()),
+        "matching_rows": sum((ref_rows & out_rows).values())
+    }
+
+
+# regexes of the original row by row implementation of extract.clean_text
+CLEAN_ROW_REGEXES = [("^[^a-zA-Z0-9]+", ""), ("( *[\.;,+] *)+$", ""), (" {2,}", " ")]
+
+
+def clean_text_row(text):
+    """Cleans up a single index text, the original row by row implementation of extract.clean_text."""
+    for reg, repl in CLEAN_ROW_REGEXES:
+        text = re.sub(reg, repl, text)
+
+    return text.strip()
+
+
+def check_clean_text(ref_path, columns=["text", "full_text"]):
+    """Compares extract.clean_text to the original row by row implementation on the texts of a reference output.
+
+    The text column of the reference outputs has already been cleaned, the full_text column has not.
+    Both implementations are timed.
+
+    Parameters
+    ----------
+    ref_path
+        path to the reference csv file
+    columns, optional
+        columns of the reference output that are cleaned, by default ["text", "full_text"]
+
+    Returns
+    -------
+        dict with: texts (quantity of cleaned texts), differences (quantity of texts where the results differ),
+        time of extract.clean_text and time of the row by row implementation in seconds, None if there is no reference
+    """
+    if not os.path.isfile(ref_path):
+        return None
+
+    ref_df = pd.read_csv(ref_path, dtype=str, keep_default_na=False)
+    result = {"texts": 0, "differences": 0, "time": 0, "time_rows": 0}
+
+    for c in columns:
+        if (not c in ref_df.columns) | ref_df.empty:
+            continue
+
+        df = ref_df[[c]].rename(columns={c: "text"})
+
+        start = time.perf_counter()
+        cleaned = extract.clean_text(df)["text"].tolist()
+        result["time"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = [clean_text_row(t) for t in df["text"]]
+        result["time_rows"] += time.perf_counter() - start
+
+        result["texts"] += len(expected)
+        result["differences"] += sum(a != b for a, b in zip(cleaned, expected))
+
+    result["time"] = round(result["time"], 4)
+    result["time_rows"] = round(result["time_rows"], 4)
+
+    return result
+
+
+def bench_file(path, reference_dir=None, save_dir=None):
+    """Extracts the index of a single file and measures the stages of the extraction.
+
+    Tesseract data frames are extracted with extract.extract_indexes_tess, pdfs with
+    extract.extract_indexes_pdf, both with the defaults of extract.extract_indexes_file.
+
+    Parameters
+    ----------
+    path
+        path to pdf or tesseract data frame
+    reference_dir, optional
+        directory with the reference outputs, by default None
+    save_dir, optional
+        if specified: directory where the extracted index is written to, can be used
+        as reference_dir of later runs, by default None
+
+    Returns
+    -------
+        dict with the results for the file
+    """
+    mode = "fitz" if path.lower().endswith(".pdf") else "tess"
+    result = {"file": path, "mode": mode, "rows": None, "wall_time": None, "peak_rss_mb": None, "error": None, "stages": None, "reference": None, "clean_check": None}
+
+    collector = profiling.StageCollector()
+    start = time.perf_counter()
+    try:
+        if mode == "fitz":
+            ind_df = extract.extract_indexes_pdf(path, remove_wrong=True, verbose=False, stage_callback=collector)
+        else:
+            ind_df = extract.extract_indexes_tess(path, file_type=os.path.splitext(path)[1], remove_wrong=True, verbose=False, stage_callback=collector)
+    except Exception as e:
+        ind_df = None
+        result["error"] = repr(e)
+    wall_time = time.perf_counter() - start
+
+    result["wall_time"] = round(wall_time, 4)
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["stages"] = stage_results(collector, wall_time)
+
+    if reference_dir != None:
+        result["clean_check"] = check_clean_text(reference_path(path, mode, reference_dir))
+
+    if not isinstance(ind_df, pd.DataFrame): # no index could be extracted
+        return result
+
+    result["rows"] = ind_df.shape[0]
+    output = ind_df.to_csv(index=False)
+
+    if save_dir != None:
+        with open(reference_path(path, mode, save_dir), "w", encoding="utf-8", newline="") as f:
+            f.write(output)
+
+    if reference_dir != None:
+        result["reference"] = compare_to_reference(output, reference_path(path, mode, reference_dir))
+
+    return result
+
+
+def total_stages(results):
+    """Sums up the time and rows of every stage over all files, the peak memory of a stage is the maximum over all files."""
+    totals = {}
+    for stage in list(STAGES) + ["other"]:
+        t = sum(r["stages"][stage]["time"] for r in results)
+        rows = sum(r["stages"][stage].get("rows", 0) for r in results)
+        peaks = [r["stages"][stage].get("peak_rss_mb") for r in results]
+        peaks = [p for p in peaks if p != None]
+        totals[stage] = {"time": round(t, 4), "rows": rows, "rows_per_s": round(rows / t, 1) if (t > 0) & (stage != "other") else None, "peak_rss_mb": max(peaks) if peaks else None}
+
+    return totals
+
+
+def defineArgumentParser():
+    """Defines the arguments of the command line tool.
+
+    Returns
+    -------
+        parser with arguments
+    """
+    parser = argparse.ArgumentParser(description="This tool benchmarks the index extraction on the bundled tesseract data frames and pdfs and compares the extracted indexes to reference outputs.")
+
+    parser.add_argument("-t", "--tess_dir", help="directory containing the tesseract data frames, default is tesseract_data_frames", default=os.path.join(ROOT_DIR, "tesseract_data_frames"))
+    parser.add_argument("-p", "--pdf_dir", help="directory containing the pdfs, default is test_files", default=os.path.join(ROOT_DIR, "test_files"))
+    parser.add_argument("-e", "--reference_dir", help="directory containing the reference outputs, default is extracted_indexes", default=os.path.join(ROOT_DIR, "extracted_indexes"))
+    parser.add_argument("-o", "--output", help="path of the json file the results are written to")
+    parser.add_argument("-s", "--save_dir", help="directory where the extracted indexes are written to, can be used as reference directory of later runs")
+    parser.add_argument("-f", "--filter", help="only benchmark files whose name contains this text")
+    parser.add_argument("--in_process", help="run all files in this process, by default every file runs in its own process so that the peak memory is measured per file", action="store_true", default=False)
+    parser.add_argument("-v", "--verbose", help="print results for every file", action="store_true", default=False)
+
+    return parser.parse_args()
+
+
+if __name__=="__main__":
+    args = defineArgumentParser()
+
+    files = []
+    if os.path.isdir(args.tess_dir):
+        files += util.list_files(args.tess_dir, suffix=tuple("." + f for f in util.TESS_FORMATS), recursive=False)
+    if os.path.isdir(args.pdf_dir):
+        files += util.list_files(args.pdf_dir, suffix=".pdf", recursive=False)
+    if args.filter != None:
+        files = [f for f in files if args.filter in os.path.basename(f)]
+    files = sorted(files)
+
+    if not os.path.isdir(args.reference_dir):
+        print(f"{args.reference_dir} is not a directory, outputs are not compared.")
+        args.reference_dir = None
+
+    if args.save_dir != None:
+        if not os.path.isdir(args.save_dir):
+            sys.exit(f"{args.save_dir} is not a directory.")
+
+    run = functools.partial(bench_file, reference_dir=args.reference_dir, save_dir=args.save_dir)
+    start = time.perf_counter()
+    results = []
+
+    if args.in_process:
+        results_iter = map(run, files)
+    else:
+        pool = multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1)
+        results_iter = pool.imap(run, files)
+
+    for r in results_iter:
+        results.append(r)
+
+        if args.verbose:
+            ref = r["reference"]
+            ref_info = "no reference" if ref == None else f"identical {ref['identical']}, {ref['matching_rows']} of {ref['ref_rows']} reference rows"
+            print(f"{os.path.basename(r['file'])} ({r['mode']}): {r['rows']} rows in {r['wall_time']:.2f}s, peak rss {r['peak_rss_mb']} MiB, {ref_info}" + (f", error {r['error']}" if r["error"] else ""))
+
+    if not args.in_process:
+        pool.close()
+        pool.join()
+
+    totals = total_stages(results)
+    compared = [r["reference"] for r in results if r["reference"] != None]
+    errors = [r["file"] for r in results if r["error"] != None]
+    clean_checks = [r["clean_check"] for r in results if r["clean_check"] != None]
+    clean_time = sum(c["time"] for c in clean_checks)
+    clean_texts = sum(c["texts"] for c in clean_checks)
+
+    summary = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "files": len(results),
+        "wall_time": round(time.perf_counter() - start, 2),
+        "errors": len(errors),
+        "compared": len(compared),
+        "identical": sum(c["identical"] for c in compared),
+        "matching_rows": sum(c["matching_rows"] for c in compared),
+        "ref_rows": sum(c["ref_rows"] for c in compared),
+        "stages": totals,
+        "clean_check": {
+            "texts": clean_texts,
+            "differences": sum(c["differences"] for c in clean_checks),
+            "time": round(clean_time, 4),
+            "time_rows": round(sum(c["time_rows"] for c in clean_checks), 4),
+            "texts_per_s": round(clean_texts / clean_time, 1) if clean_time > 0 else None
+        }
+    }
+
+    print(f"{summary['files']} files in {summary['wall_time']}s, {summary['errors']} errors, {summary['identical']} of {summary['compared']} outputs identical to the reference, {summary['matching_rows']} of {summary['ref_rows']} reference rows matched")
+    for stage, s in totals.items():
+        print(f"  {stage:<10} {s['time']:>9.2f}s" + (f" {s['rows_per_s']:>12.0f} rows/s" if s["rows_per_s"] != None else "") + (f" {s['peak_rss_mb']:>9.1f} MiB peak" if s["peak_rss_mb"] != None else ""))
+
+    c = summary["clean_check"]
+    print(f"clean_text on the reference texts: {c['differences']} of {c['texts']} texts differ from the row by row implementation, {c['time']:.2f}s (row by row {c['time_rows']:.2f}s)")
+
+    if args.output != None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2)
+
+    if (len(errors) > 0) | (summary["clean_check"]["differences"] > 0):
+        sys.exit(1)
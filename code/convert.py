@@ -0,0 +1,42 @@
+"""This script implements the command line tool to convert tesseract data frames saved as csv files
+to a columnar binary format (feather or parquet) that is faster to load."""
+
+import argparse
+import os
+
+import util
+
+def defineArgumentParser():
+    """Defines the arguments of the command line tool.
+
+    Returns
+    -------
+        parser with arguments
+    """    
+    parser = argparse.ArgumentParser(description="This tool converts tesseract data frames saved as csv files to feather or parquet files with compact dtypes.")
+
+    parser.add_argument("input_path", help="path to the csv file or directory containing the csv files")
+    parser.add_argument("output_dir", help="path to the directory where the converted files will be written to")
+    parser.add_argument("-f", "--format", help="file format of the converted files, FEATHER or PARQUET, default is FEATHER", default="feather")
+    parser.add_argument('-r', '--recursive', type=int, help='only when input path is a directory, define if path should be searched recursively, optional: how many levels of subdirectories should be searched', nargs='?', default=False, const=True)
+    parser.add_argument("-v", "--verbose", help="print infos during conversion", action="store_true", default=False)
+
+    return parser.parse_args()
+
+
+if __name__=="__main__":
+    args = defineArgumentParser()
+
+    f = str.lower(args.format)
+
+    if (f == "csv") | (not f in util.TESS_FORMATS):
+        print(f"{args.format} is not a supported file format.")
+    elif not os.path.isdir(args.output_dir):
+        print(f"{args.output_dir} is not a directory.")
+    elif os.path.isdir(args.input_path):
+        for path in util.iter_files(args.input_path, suffix=".csv", recursive=args.recursive):
+            util.convert_tess_df(path, args.output_dir, file_format=f, verbose=args.verbose)
+    elif os.path.isfile(args.input_path):
+        util.convert_tess_df(args.input_path, args.output_dir, file_format=f, verbose=args.verbose)
+    else:
+        print("Input path is not valid.")
@@ -1,10 +1,88 @@
 """This script contains methods concerning the date extraction from the index texts."""
 
 import pandas as pd
+import numpy as np
 import re
 import datetime
 
 from difflib import get_close_matches
+from functools import lru_cache
+
+
+def lax_date_regexes():
+    """Returns the lax versions of the regexes for the four date types, used for the extraction of the dates.
+
+    The whole regex is enclosed in a group, so group 0 of a match is the complete date.
+
+    Returns
+    -------
+        dict with the compiled regex for every date type
+    """
+    digit = "[0-9oOIltriSQzZ]"
+    big_i = "[I1l]"
+    one = "[1Iltri]"
+
+    day = "(?<![0-9])([1-3IltrizZ]?" + digit + ")(?![0-9])" # 4 | 31
+    dayth = day + "(st|nd|rd|th)?" # 4th | 31st
+    month_short = "([A-Za-zé]{3,4}[.:,]?)" # Dec. | June | Sept.
+    month_long = "([A-Za-zé]{3,9})" # February
+    #year = "(" + one + "9"  + digit + "{2})" # too strict?
+    year = "(" + digit + "{4})"
+
+    # in the beginning, example: Nov. 4 | July 25th
+    re_d1 = "^" + month_short + " " + dayth
+
+    # in the beginning, example: 13/III/1986 | 7/IX/1985
+    re_d2 = "^" + day + "[/,;.]{1,2}(" + big_i + "{0,3}[VX]?" + big_i + "{0,3})[/,;.]{1,2}" + year
+
+    # towards the end, example: 25th February, 1929
+    re_d3 = dayth + " " + month_long + "[,.:]? " + year
+
+    # in the beginning, example: 16 Dec. 1965 | 7 May, 1988 | 1st June
+    re_d4 = "^" + dayth + " " + month_long + "[,.:]{0,2}( " + year + ")?"
+
+    return {i+1: re.compile("(" + r + ")") for i, r in enumerate([re_d1, re_d2, re_d3, re_d4])}
+
+
+DATE_REGEXES = lax_date_regexes()
+DATE_GROUPS = {1: (2, 1, 0), 2: (1, 2, 3), 3: (1, 3, 4), 4: (1, 3, 5)} # groups of day, month and year for every date type, 0 if there is none
+
+
+def strict_date_regexes():
+    """Returns the strict versions of the regexes for the four date types, used to determine the date type.
+
+    Returns
+    -------
+        dict with the compiled regex for every date type
+    """
+    digit = "[0-9]"
+    big_i = "[I1l]"
+    one = "[1Il]"
+
+    day = "(?<![0-9])(?:[1-3]?" + digit + ")(?![0-9])" # 4 | 31
+    dayth = day + "(?:st|nd|rd|th)?" # 4th | 31st
+    month_short = "(?:[A-Za-zé]{3,4}\\.?)" # Dec. | June | Sept.
+    month_long = "(?:[A-Za-zé]{3,9})" # February
+    year = "(?:" + one + "9"  + digit + "{2})"
+
+    # in the beginning, example: Nov. 4 | July 25th
+    re_d1 = "^" + month_short + " " + dayth
+
+    # in the beginning, example: 13/III/1986 | 7/IX/1985
+    re_d2 = "^" + day + "/" + big_i + "{0,3}[VX]?" + big_i + "{0,3}/" + year
+
+    # towards the end, example: 25th February, 1929
+    re_d3 = dayth + " " + month_long + "[,.:]? " + year
+
+    # in the beginning, example: 16 Dec. 1965 | 7 May, 1988 | 1st June
+    re_d4 = "^" + dayth + " " + month_long + "[,.:]{0,2}(?: " + year + ")?"
+
+    return {i+1: re.compile(r) for i, r in enumerate([re_d1, re_d2, re_d3, re_d4])}
+
+
+STRICT_DATE_REGEXES = strict_date_regexes()
+
+QUOTES_REGEX = re.compile("[\"'`“´‘]")
 
 
 def extract_dates(ind_df, file_name):
@@ -32,6 +110,9 @@ def extract_dates(ind_df, file_name):
 def extract_dates_of_type(ind_df, date_type):
     """Extracts the dates of the specified type from the texts.
 
+    The precompiled regex of the date type is applied to all texts at once. For date type 3
+    the last date in a text is extracted, for the other types the date in the beginning of the text.
+
     Parameters
     ----------
     ind_df
@@ -50,157 +131,106 @@ def extract_dates_of_type(ind_df, date_type):
     df["extracted_year"] = ""
     df["full_text"] = df["text"]
 
-    # lax versions
-    digit = "[0-9oOIltriSQzZ]"
-    big_i = "[I1l]"
-    one = "[1Iltri]"
+    if (not date_type in DATE_REGEXES) | df.empty:
+        return df
 
-    day = "(?<![0-9])([1-3IltrizZ]?" + digit + ")(?![0-9])" # 4 | 31
-    dayth = day + "(st|nd|rd|th)?" # 4th | 31st
-    month_short = "([A-Za-zé]{3,4}[.:,]?)" # Dec. | June | Sept.
-    month_long = "([A-Za-zé]{3,9})" # February
-    #year = "(" + one + "9"  + digit + "{2})" # too strict?
-    year = "(" + digit + "{4})"
+    re_d = DATE_REGEXES[date_type]
+    day_g, month_g, year_g = DATE_GROUPS[date_type]
 
-    # in the beginning, example: Nov. 4 | July 25th
-    re_d1 = "^" + month_short + " " + dayth
+    text = df["text"].str.replace(QUOTES_REGEX, "", regex=True)
 
-    # in the beginning, example: 13/III/1986 | 7/IX/1985
-    re_d2 = "^" + day + "[/,;.]{1,2}(" + big_i + "{0,3}[VX]?" + big_i + "{0,3})[/,;.]{1,2}" + year
+    if date_type == 3: # the last date in the text
+        d = text.str.extractall(re_d)
+        d = d.loc[~d.index.get_level_values(0).duplicated(keep="last")].droplevel(1)
+    else:
+        d = text.str.extract(re_d).dropna(subset=[0])
 
-    # towards the end, example: 25th February, 1929
-    re_d3 = dayth + " " + month_long + "[,.:]? " + year
+    df.loc[d.index, "extracted_date"] = d[0]
+    df.loc[d.index, "extracted_day"] = d[day_g]
+    df.loc[d.index, "extracted_month"] = d[month_g]
 
-    # in the beginning, example: 16 Dec. 1965 | 7 May, 1988 | 1st June
-    re_d4 = "^" + dayth + " " + month_long + "[,.:]{0,2}( " + year + ")?"
+    if year_g != 0:
+        df.loc[d.index, "extracted_year"] = d[year_g]
 
-    re_d = None
-    day_g = 0
-    month_g = 0
-    year_g = 0
-
-    if date_type > -1:
-        if date_type == 1:
-            re_d = re_d1
-            day_g = 2
-            month_g = 1
-        elif date_type == 2:
-            re_d = re_d2
-            day_g = 1
-            month_g = 2
-            year_g = 3
-        elif date_type == 3:
-            re_d = re_d3
-            day_g = 1
-            month_g = 3
-            year_g = 4
-        elif date_type == 4:
-            re_d = re_d4
-            day_g = 1
-            month_g = 3
-            year_g = 5
-
-        for i, row in df.iterrows():
-            text = re.sub("[\"'`“´‘]", "", row["text"])
-            d = None
-            #text = re.sub("[,.]", "", text)
-
-            if date_type != 3:
-                d = re.search(re_d, text)
-            if date_type == 3:
-                for m in re.finditer(re_d, text):
-                    d = m
-
-            if not d == None:
-                df.loc[i, "extracted_date"] = d.group()
-                df.loc[i, "extracted_day"] = d.group(day_g)
-                df.loc[i, "extracted_month"] = d.group(month_g)
-
-                if year_g != 0:
-                    df.loc[i, "extracted_year"] = d.group(year_g)
-
-                df.loc[i, "text"] = re.sub(re_d, "", row["text"])
+    df.loc[d.index, "text"] = df.loc[d.index, "text"].str.replace(re_d, "", regex=True)
     
     return df
 
 
 
-def get_date_type(ind_df):
+def get_date_type(ind_df, sample_size=None, max_sample_size=2000, chunk_size=100, dominance=0.9):
     """Determines the date type of the document.
 
-    Four types have been identified.
+    Four types have been identified. The types are counted on a deterministic sample of rows that
+    are evenly spread over the document, so reruns on the same document give the same type.
+    The sample is evaluated in chunks that each cover the whole document and the evaluation
+    stops early, once the leading type can no longer be overtaken or clearly dominates.
 
     Parameters
     ----------
     ind_df
         index data frame
+    sample_size, optional
+        number of rows that are evaluated, if None all rows but at most max_sample_size
+        are used, by default None
+    max_sample_size, optional
+        upper bound of the default sample size, caps the cost for very large indexes, by default 2000
+    chunk_size, optional
+        number of rows that are evaluated before checking whether to stop early, by default 100
+    dominance, optional
+        share of the evaluated rows the leading type needs to stop early, by default 0.9
 
     Returns
     -------
         date type as int, 1 <= date_type <= 4 are valid types,
         -1 if no date type could be identified
     """    
+    text = ind_df["full_text"] if "full_text" in ind_df.columns else ind_df["text"]
+    n = text.shape[0]
 
-    df = ind_df.copy()
-    if not "full_text" in df.columns:
-        df["full_text"] = df["text"]
+    if sample_size == None:
+        sample_size = max_sample_size
+    sample_size = min(sample_size, n)
 
-    # strict versions
-    digit = "[0-9]"
-    big_i = "[I1l]"
-    one = "[1Il]"
+    if sample_size < 1:
+        return -1
 
-    day = "(?<![0-9])([1-3]?" + digit + ")(?![0-9])" # 4 | 31
-    dayth = day + "(st|nd|rd|th)?" # 4th | 31st
-    month_short = "([A-Za-zé]{3,4}\.?)" # Dec. | June | Sept.
-    month_long = "([A-Za-zé]{3,9})" # February
-    year = "(" + one + "9"  + digit + "{2})"
+    # stratified sample: rows evenly spread over the document, chunks interleaved so every chunk covers the whole document
+    rows = np.unique(np.linspace(0, n-1, sample_size).round().astype(int))
+    n_chunks = max(rows.shape[0]//chunk_size, 1)
+    rows = np.concatenate([rows[i::n_chunks] for i in range(n_chunks)])
+    chunk_size = -(-rows.shape[0]//n_chunks)
 
-    # in the beginning, example: Nov. 4 | July 25th
-    re_d1 = "^" + month_short + " " + dayth
+    counts = pd.Series(0, index=[4, 1, 2, 3, -1]) # order decides ties
+    for start in range(0, rows.shape[0], chunk_size):
+        counts += get_date_types(text.iloc[rows[start:start+chunk_size]]).value_counts().reindex(counts.index, fill_value=0)
 
-    # in the beginning, example: 13/III/1986 | 7/IX/1985
-    re_d2 = "^" + day + "/" + big_i + "{0,3}[VX]?" + big_i + "{0,3}/" + year
-
-    # towards the end, example: 25th February, 1929
-    re_d3 = dayth + " " + month_long + "[,.:]? " + year
-
-    # in the beginning, example: 16 Dec. 1965 | 7 May, 1988 | 1st June
-    re_d4 = "^" + dayth + " " + month_long + "[,.:]{0,2}( " + year + ")?"
+        evaluated = counts.sum()
+        first, second = counts.sort_values(ascending=False, kind="mergesort").iloc[:2]
+        if (first - second > rows.shape[0] - evaluated) | (first >= dominance*evaluated):
+            break
 
-    samp = df.sample(min(max(df.shape[0]//4, 50), df.shape[0]))
-    samp["date_type"] = -1
+    return counts.idxmax()
 
-    for i, row in samp.iterrows():
-        t = row["full_text"]
-        dt = -1
 
-        d1 = re.search(re_d1, t)
-        d2 = re.search(re_d2, t)
-        d3 = None
-        d4 = re.search(re_d4, t)
+def get_date_types(texts):
+    """Determines the date type of every text with the strict date regexes.
 
-        for m in re.finditer(re_d3, t):
-            d3 = m
+    If several types match, 4 is preferred over 1, 1 over 2 and 2 over 3.
 
-            dt = 3
-        if d2 != None:
-            dt = 2
-        if d1 != None:
-            dt = 1
-        if d4 != None:
-            dt = 4
-
-        samp.loc[i, ["date_type"]] = dt
-
-    date_type = samp.groupby("date_type").count().sort_values("country", ascending=False)
+    Parameters
+    ----------
+    texts
+        series of texts
 
-    if not date_type.empty:
-        date_type = date_type.iloc[0].name
-    else:
-        date_type = -1
+    Returns
+    -------
+        series with the date type of every text, -1 where no date type matches
+    """
+    texts = texts.astype(str)
+    matches = [texts.str.contains(STRICT_DATE_REGEXES[t], regex=True) for t in (4, 1, 2, 3)]
 
-    return date_type
+    return pd.Series(np.select(matches, [4, 1, 2, 3], default=-1), index=texts.index)
 
 
 def norm_dates(ind_df, date_type, file_name):
@@ -231,26 +261,27 @@ def norm_dates(ind_df, date_type, file_name):
         df["date"] = ""
         df["year"] = ""
 
-    for i, row in df.iterrows():
-        da = row["extracted_day"]
-        mo = row["extracted_month"]
-        ye = row["extracted_year"]
-
-        day = correct_digit_recognition(da)
+    def norm_year(ye):
         year = correct_digit_recognition(ye)
-        month = norm_month(mo,date_type)
 
-        if month != None:
+        if year:
+            if (int(year) > cur_year):
+                if file_year != None:
+                    year = file_year.group()[0] + year[1:]
+                else:
+                    year = "1" + year[1:]
+
+        return year
+
+    # every distinct token is only normalized once, the results are mapped to the rows
+    months = map_distinct(df["extracted_month"], lambda mo: norm_month(mo, date_type))
+    found = months.notna()
 
-            if year:
-                if (int(year) > cur_year):
-                    if file_year != None:
-                        year = file_year.group()[0] + year[1:]
-                    else:
-                        year = "1" + year[1:]
+    days = map_distinct(df.loc[found, "extracted_day"], correct_digit_recognition)
+    years = map_distinct(df.loc[found, "extracted_year"], norm_year)
 
-            df.loc[i, "year"] = year
-            df.loc[i, "date"] = f"{day}.{month}."
+    df.loc[found, "year"] = years
+    df.loc[found, "date"] = days + "." + months.loc[found].astype(str) + "."
 
     if file_year != None:
         df.loc[(df["date"]!="") & (df["year"]==""), "year"] = file_year.group()
@@ -285,10 +316,46 @@ def correct_digit_recognition(dig):
         return ""
 
 
+def map_distinct(tokens, func):
+    """Applies a function to every distinct token of a series and maps the results to the series.
+
+    Parameters
+    ----------
+    tokens
+        series
+    func
+        function that is applied to the tokens
+
+    Returns
+    -------
+        series with the results, same index as tokens, dtype object
+    """
+    codes, uniques = pd.factorize(tokens)
+
+    results = [func(t) for t in uniques]
+    missing = codes == -1
+    results.append(func(tokens.loc[missing].iloc[0]) if missing.any() else None) # missing values have code -1
+
+    return pd.Series(np.array(results, dtype=object)[codes], index=tokens.index, dtype=object)
+
+
+MONTHS = {
+    "en_short": ["Jan", "Feb", "Mar", "Apr", "May", "June", "July", "Aug", "Sep", "Oct", "Nov", "Dec"],
+    "fr_short": ["janv", "fév", "mars", "avril", "mai", "juin", "juillet", "aout", "sept", "oct", "nov", "déc"],
+    "es_short": ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "sept", "oct", "nov", "dic"],
+    "roman": ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI", "XII"],
+    "en": ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"],
+    "fr": ["janvier", "février", "mars", "avril", "mai", "juin", "juillet", "aout", "septembre", "octobre", "novembre", "décembre"],
+    "es": ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+}
+
+
 def norm_month(month, date_type, ignore_case=True):
     """Normalizes the extracted month according to the date type.
 
     Works for English, Spanish and French months.
+    The tokens are matched by match_month, which caches its results, so every distinct
+    token is only matched once.
 
     Parameters
     ----------
@@ -303,28 +370,50 @@ def norm_month(month, date_type, ignore_case=True):
     -------
         str, normalized month as digit(s) from 1 to 12, None if it could not be normalized
     """    
-    mon_l = list()
     month = str(month)
     month = re.sub("[.,:]", "", month)
 
+    return match_month(month, date_type, ignore_case)
+
+
+@lru_cache(maxsize=4096)
+def match_month(month, date_type, ignore_case=True):
+    """Matches a month token to the most similar month name of the date type.
+
+    Results are cached for every combination of token, date type and ignore_case.
+
+    Parameters
+    ----------
+    month
+        str, month without punctuation
+    date_type
+        date_type of the document, int, 1 <= date_type <= 4
+    ignore_case, optional
+        if True: upper and lower case of the month will be ignored, by default True
+
+    Returns
+    -------
+        normalized month as int from 1 to 12, None if it could not be normalized
+    """
+    mon_l = list()
     mon_l_french = []
     mon_l_spanish = []
 
     if (date_type == 1) | (date_type == 4):
-        mon_l = ["Jan", "Feb", "Mar", "Apr", "May", "June", "July", "Aug", "Sep", "Oct", "Nov", "Dec"]
+        mon_l = MONTHS["en_short"]
         if date_type == 4:
-            mon_l_french = ["janv", "fév", "mars", "avril", "mai", "juin", "juillet", "aout", "sept", "oct", "nov", "déc"]
-            mon_l_spanish = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "sept", "oct", "nov", "dic"]
+            mon_l_french = MONTHS["fr_short"]
+            mon_l_spanish = MONTHS["es_short"]
 
     elif date_type == 2:
-        mon_l = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI", "XII"]
+        mon_l = MONTHS["roman"]
         month = re.sub("[1il]", "I", month)
         ignore_case = False
 
     elif (date_type == 3):
-        mon_l = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
-        mon_l_french = ["janvier", "février", "mars", "avril", "mai", "juin", "juillet", "aout", "septembre", "octobre", "novembre", "décembre"]
-        mon_l_spanish = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+        mon_l = MONTHS["en"]
+        mon_l_french = MONTHS["fr"]
+        mon_l_spanish = MONTHS["es"]
 
     else:
         return None
@@ -3,6 +3,10 @@
 import pandas as pd
 import re
 import os
+import time
+import datetime
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import util
 import lines
@@ -10,12 +14,32 @@ import group
 import label
 import records
 import date
+import profiling
+import progress
+import manifest
 
 
-def extract_indexes_dir(path_dir, output_dir, mode=None, recursive=False, remove_wrong=True, verbose=True, tesseract_path=None):
+def extract_indexes_dir(path_dir, output_dir, mode=None, recursive=False, remove_wrong=True, verbose=True, tesseract_path=None, jobs=1, ocr_workers=None, ocr_cache=None, fitz_workers=1, stage_callback=None, progress_log=None, summary_path=None, incremental=False):
     """Extracts the index of all files in a directory and writes the csv files to the specified path.
 
     Generates one output file containing the extracted index for each input file.
+    The directory is walked once, the extraction of the files starts while it is walked. If output_dir
+    is a subdirectory of path_dir, it is not searched, and the index files written by this extraction
+    are never extracted themselves.
+    If jobs is greater than 1, the files are extracted in parallel by a pool of processes.
+    A file where the extraction fails does not stop the extraction of the other files,
+    the failed files and the files where no index could be extracted are reported in a summary at the end.
+
+    If progress_log is specified, events are written when the batch starts, when a file starts
+    and when a file is done or failed. The events of finished files contain the files completed
+    and in flight, files per second, the estimated remaining time and the durations of the stages
+    of the file. As long as the directory is walked, the total and the estimated remaining time only
+    include the files found so far. If summary_path is specified, a json summary of the run is written there at the end.
+
+    If incremental is True, a manifest in output_dir records the content hash of the input, the settings
+    and the version of the extraction code of every extracted file, see manifest. Files whose input,
+    settings and code did not change since their last extraction are skipped. A file whose output file
+    has the same name as the output of another file of the directory fails instead of overwriting it.
 
     Mode fitz: Uses existing ocr of the pdf files. Does not work with double paged documents. Input must be pdf.
     Mode tess: Uses the tesseract engine to generate ocr for a pdf or gets a tesseract data frame as input.
@@ -23,11 +47,11 @@ def extract_indexes_dir(path_dir, output_dir, mode=None, recursive=False, remove
     Parameters
     ----------
     path_dir
-        directory containing pdf files and/or tesseract data frames as csv
+        directory containing pdf files and/or tesseract data frames as csv, feather or parquet files
     output_dir
         directory where the index will be written to
     mode, optional
-        mode of operation, "fitz" or "tess", if None it will be determined based on file type: pdf->fitz, csv->tess, by default None
+        mode of operation, "fitz" or "tess", if None it will be determined based on file type: pdf->fitz, csv/feather/parquet->tess, by default None
     recursive, optional
         True if path_dir should be searched for files recursively, if type is integer: how many levels of subdirectories
         should be searched, by default False
@@ -37,28 +61,241 @@ def extract_indexes_dir(path_dir, output_dir, mode=None, recursive=False, remove
         print infos, by default True
     tesseract_path, optional
         define path to tesseract executable, by default None
+    jobs, optional
+        number of files that are extracted in parallel, if smaller than 1: number of cpus, by default 1
+    ocr_workers, optional
+        number of pages that are recognized in parallel by tesseract, if None: number of cpus divided by jobs,
+        if smaller than 1: number of cpus, by default None
+    ocr_cache, optional
+        if specified: directory where the tesseract ocr of pdf pages is cached and reused, by default None
+    fitz_workers, optional
+        number of processes that read the pages of a pdf in parallel in mode fitz, if smaller than 1: number of cpus, by default 1
+    stage_callback, optional
+        function that is called with the measurements of every stage of the extraction, see profiling.run_stage, by default None
+    progress_log, optional
+        function that is called with the name and the fields of every progress event, e.g. progress.ProgressLog,
+        must be picklable if jobs is greater than 1, by default None
+    summary_path, optional
+        if specified: path of the json file the summary of the run is written to, by default None
+    incremental, optional
+        True if files that have already been extracted from the same input with the same settings and code should be skipped, by default False
+
+    Returns
+    -------
+        list of the files where the extraction failed
 
     Raises
     ------
     ValueError
         if path_dir is not a directory
+    ValueError
+        if stage_callback is used with more than one job
+    ValueError
+        if incremental is True and output_dir is not a directory
     """
     if not os.path.isdir(path_dir):
         raise ValueError(f"{path_dir} is not a directory.")
 
-    suffix = [".csv", ".pdf"]
+    suffix = ["." + f for f in util.TESS_FORMATS] + [".pdf"]
     if mode == "fitz":
-        suffix.remove(".csv")
+        suffix = [".pdf"]
+
+    if jobs < 1:
+        jobs = os.cpu_count()
+
+    if (stage_callback != None) & (jobs > 1):
+        raise ValueError("stage_callback only works with jobs=1, it cannot be called from the worker processes.")
+
+    if (ocr_workers == None) & (jobs > 1):
+        ocr_workers = max(1, os.cpu_count() // jobs) # the cpus are shared by the jobs, not one tesseract process per cpu for every job
+
+    skipped = []
+    if incremental:
+        if not os.path.isdir(output_dir):
+            raise ValueError(f"{output_dir} is not a directory.")
+
+        entries = manifest.load(output_dir)
+        new_entries = {}
+        outputs = {} # input files by name of their output file
+        manifest_saved = time.time()
+
+    kwargs = {"output_dir": output_dir, "mode": mode, "remove_wrong": remove_wrong, "verbose": verbose, "tesseract_path": tesseract_path, "ocr_workers": ocr_workers, "ocr_cache": ocr_cache, "fitz_workers": fitz_workers, "stage_callback": stage_callback, "progress_log": progress_log}
+    started = datetime.datetime.now()
+    start = time.time()
+    failed = []
+    results = []
+    throughput = progress.Throughput(0) # the total grows while the directory is walked
+
+    # walks path_dir once and yields the files that have to be extracted, so the extraction starts before the walk is finished
+    def files_to_extract():
+        outputs_of_run = set() # index files written by this extraction, they could be found by the walk if output_dir is path_dir
+
+        for f in util.iter_files(path_dir, suffix=suffix, recursive=recursive, exclude=[output_dir]):
+            if os.path.abspath(f) in outputs_of_run:
+                continue
+            outputs_of_run.add(os.path.abspath(os.path.join(output_dir, manifest.output_name(f, mode))))
+
+            if incremental:
+                key = os.path.relpath(f, path_dir)
+                try:
+                    name = manifest.output_name(f, mode)
+                    if name in outputs:
+                        raise ValueError(f"The index would be written to {name}, the output of {outputs[name]}.")
+
+                    entry = manifest.make_entry(f, mode, remove_wrong=remove_wrong, tesseract_path=tesseract_path, previous=entries.get(key))
+                    outputs[name] = f
+                except Exception as e: # fails only this file, like an error of the extraction
+                    throughput.total += 1
+                    file_done(f, None, e)
+                    continue
+
+                if manifest.is_up_to_date(entries.get(key), entry, output_dir):
+                    skipped.append(f)
+                    entries[key].update(size=entry["size"], mtime_ns=entry["mtime_ns"]) # a touched file is not hashed again next time
+                    continue
+
+                new_entries[f] = (key, entry)
+
+            throughput.total += 1
+            yield f
+
+    if progress_log != None:
+        progress_log("batch_started", input_dir=path_dir, output_dir=output_dir, jobs=jobs, incremental=incremental)
+
+    def file_done(f, result, error):
+        nonlocal manifest_saved
+        throughput.update()
+        if error != None:
+            failed.append(f)
+            print(f"Extraction failed for {f}: {error!r}")
+            result = {"rows": None, "duration": None, "stages": None}
+        elif incremental:
+            key, entry = new_entries[f]
+            manifest.record(entries, key, entry, result["rows"])
+
+            if time.time() - manifest_saved >= manifest.SAVE_INTERVAL: # not after every file, the whole manifest is written every time
+                manifest.save(output_dir, entries)
+                manifest_saved = time.time()
+
+        results.append({"file": f, "error": None if error == None else repr(error), **result})
+
+        if progress_log != None:
+            in_flight = min(jobs, throughput.total - throughput.done)
+            progress_log("file_done" if error == None else "file_failed", **results[-1], files_failed=len(failed), files_in_flight=in_flight, **throughput.fields("files"))
+
+    if jobs == 1:
+        for f in files_to_extract():
+            try:
+                result = extract_indexes_batch_file(f, **kwargs)
+            except Exception as e:
+                file_done(f, None, e)
+            else:
+                file_done(f, result, None)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(extract_indexes_batch_file, f, **kwargs): f for f in files_to_extract()}
+
+            for future in as_completed(futures):
+                f = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    file_done(f, None, e)
+                else:
+                    file_done(f, result, None)
+
+    if incremental:
+        manifest.save(output_dir, entries)
+        print(f"{len(skipped)} file(s) were up to date and skipped.")
+
+    failed.sort()
+    duration = time.time() - start
+    files_total = throughput.total
+    empty = sorted(r["file"] for r in results if (r["error"] == None) & (r["rows"] == None)) # no index could be extracted, no output was written
+    print(f"Extracted {files_total-len(failed)-len(empty)} of {files_total} file(s) in {duration:.1f}s, {len(empty)} without index, {len(failed)} failed.")
+    for f in failed:
+        print(f"Failed: {f}")
+    for f in empty:
+        print(f"No index: {f}")
+
+    rows = sum(r["rows"] for r in results if r["rows"] != None)
+    stages = {}
+    for r in results:
+        for stage, d in (r["stages"] or {}).items():
+            stages[stage] = round(stages.get(stage, 0) + d, 4)
+
+    summary = {
+        "started": started.isoformat(timespec="seconds"),
+        "finished": datetime.datetime.now().isoformat(timespec="seconds"),
+        "input_dir": path_dir,
+        "output_dir": output_dir,
+        "jobs": jobs,
+        "duration_s": round(duration, 2),
+        "files_total": files_total,
+        "files_completed": files_total - len(failed) - len(empty),
+        "files_empty": len(empty),
+        "files_failed": len(failed),
+        "files_skipped": len(skipped),
+        "rows": rows,
+        "files_per_s": round(files_total / duration, 3) if duration > 0 else None,
+        "rows_per_s": round(rows / duration, 1) if duration > 0 else None,
+        "stages": stages,
+        "failed": failed,
+        "empty": empty,
+        "files": sorted(results, key=lambda r: r["file"])
+    }
+
+    if progress_log != None:
+        progress_log("batch_done", **{k: v for k, v in summary.items() if k != "files"})
+
+    if summary_path != None:
+        progress.write_summary(summary_path, summary)
+
+    return failed
+
+
+def extract_indexes_batch_file(path, stage_callback=None, progress_log=None, **kwargs):
+    """Extracts the index of a single file as part of a batch, used by extract_indexes_dir.
+
+    The stages of the extraction are measured. Only the quantity of extracted records and the durations
+    are returned, so that the index data frame does not have to be sent back from a worker process.
+
+    Parameters
+    ----------
+    path
+        path to file, pdf or tesseract data frame as csv, feather or parquet file
+    stage_callback, optional
+        function that is called with the measurements of every stage of the extraction, see profiling.run_stage, by default None
+    progress_log, optional
+        function that is called with the name and the fields of every progress event, by default None
+    kwargs
+        arguments for extract_indexes_file
+
+    Returns
+    -------
+        dict with: rows (quantity of extracted records, None if no index could be extracted),
+        duration in seconds and stages (summed duration of every stage in seconds)
+    """
+    collector = profiling.StageCollector()
+    callback = collector
+    if stage_callback != None:
+        def callback(record):
+            collector(record)
+            stage_callback(record)
 
-    files = []
-    for s in suffix:
-        files += util.list_files(path_dir, recursive=recursive, suffix=s)
+    if progress_log != None:
+        progress_log("file_started", file=path, pid=os.getpid())
 
-    for f in files:
-        extract_indexes_file(f, output_dir=output_dir, mode=mode, remove_wrong=remove_wrong, verbose=verbose, tesseract_path=tesseract_path)
+    start = time.perf_counter()
+    ind_df = extract_indexes_file(path, stage_callback=callback, progress_log=progress_log, **kwargs)
+    duration = time.perf_counter() - start
 
+    stages = collector.to_frame().groupby("stage", sort=False)["duration"].sum().round(4).to_dict()
 
-def extract_indexes_file(path, output_dir=None, mode=None, start_page=1, remove_wrong=True, verbose=True, double_paged=None, country_centered=False, start_indented=False, tesseract_path=None):
+    return {"rows": ind_df.shape[0] if isinstance(ind_df, pd.DataFrame) else None, "duration": round(duration, 3), "stages": stages}
+
+
+def extract_indexes_file(path, output_dir=None, mode=None, start_page=1, remove_wrong=True, verbose=True, double_paged=None, country_centered=False, start_indented=False, tesseract_path=None, ocr_workers=None, ocr_cache=None, fitz_workers=1, stage_callback=None, progress_log=None):
     """Extracts and returns the index of a single file.
 
     Mode fitz: Uses existing ocr of the pdf files. Does not work with double paged documents. Input must be pdf.
@@ -67,11 +304,11 @@ def extract_indexes_file(path, output_dir=None, mode=None, start_page=1, remove_
     Parameters
     ----------
     path
-        path to file, pdf or tesseract data frame as csv
+        path to file, pdf or tesseract data frame as csv, feather or parquet file
     output_dir, optional
         if specified: directory where the index csv file will be written to, by default None
     mode, optional
-        mode of operation, "fitz" or "tess", if None it will be determined based on file type: pdf->fitz, csv->tess, by default None
+        mode of operation, "fitz" or "tess", if None it will be determined based on file type: pdf->fitz, csv/feather/parquet->tess, by default None
     start_page, optional
         page from which the extraction should start, by default 1
     remove_wrong, optional
@@ -87,6 +324,16 @@ def extract_indexes_file(path, output_dir=None, mode=None, start_page=1, remove_
         set True, if the first line of every index in this document is indented, by default False
     tesseract_path, optional
         define path to tesseract executable, by default None
+    ocr_workers, optional
+        number of pages that are recognized in parallel by tesseract, if None or smaller than 1: number of cpus, by default None
+    ocr_cache, optional
+        if specified: directory where the tesseract ocr of pdf pages is cached and reused, by default None
+    fitz_workers, optional
+        number of processes that read the pages of a pdf in parallel in mode fitz, if smaller than 1: number of cpus, by default 1
+    stage_callback, optional
+        function that is called with the measurements of every stage of the extraction, see profiling.run_stage, by default None
+    progress_log, optional
+        function that is called with the name and the fields of every progress event of the ocr, by default None
 
     Returns
     -------
@@ -99,7 +346,7 @@ def extract_indexes_file(path, output_dir=None, mode=None, start_page=1, remove_
     ValueError
         if the file type is not supported
     ValueError
-        if fitz is used with a csv file
+        if fitz is used with a tesseract data frame
     ValueError
         if output_dir is not an existing directory
     ValueError
@@ -111,13 +358,13 @@ def extract_indexes_file(path, output_dir=None, mode=None, start_page=1, remove_
     f_name, f_suffix = os.path.splitext(path)
     f_name = os.path.basename(f_name)
 
-    if (not f_suffix == ".pdf") & (not f_suffix == ".csv"):
+    if (not f_suffix == ".pdf") & (not f_suffix.lstrip(".") in util.TESS_FORMATS):
         raise ValueError(f"{f_suffix} is not a supported file type.")
 
     if mode == None:
         if f_suffix == ".pdf":
             mode = "fitz"
-        elif f_suffix == ".csv":
+        else:
             mode = "tess"
     elif (mode == "fitz") & (not f_suffix == ".pdf"):
         raise ValueError("Mode fitz can only be used with pdf files.")
@@ -131,14 +378,14 @@ def extract_indexes_file(path, output_dir=None, mode=None, start_page=1, remove_
         save_path = os.path.join(output_dir, f_name + f"_{mode}.csv")
 
     if mode=="fitz":
-        return extract_indexes_pdf(path, start_page=start_page, save_to=save_path, remove_wrong=remove_wrong, verbose=verbose, country_centered=country_centered, start_indented=start_indented)
+        return extract_indexes_pdf(path, start_page=start_page, save_to=save_path, remove_wrong=remove_wrong, verbose=verbose, country_centered=country_centered, start_indented=start_indented, workers=fitz_workers, stage_callback=stage_callback)
     elif mode=="tess":
-        return extract_indexes_tess(path, file_type=f_suffix, start_page=start_page, save_to=save_path, remove_wrong=remove_wrong, verbose=verbose, double_paged=double_paged, country_centered=country_centered, start_indented=start_indented, tesseract_path=tesseract_path)
+        return extract_indexes_tess(path, file_type=f_suffix, start_page=start_page, save_to=save_path, remove_wrong=remove_wrong, verbose=verbose, double_paged=double_paged, country_centered=country_centered, start_indented=start_indented, tesseract_path=tesseract_path, ocr_workers=ocr_workers, ocr_cache=ocr_cache, stage_callback=stage_callback, progress_log=progress_log)
     else:
         raise ValueError(f"{mode} is not a supported mode.")
 
 
-def extract_indexes_pdf(pdf_path, start_page=1, remove_wrong=False, verbose=True, save_to=None, country_centered=False, start_indented=False, date_extraction=True):
+def extract_indexes_pdf(pdf_path, start_page=1, remove_wrong=False, verbose=True, save_to=None, country_centered=False, start_indented=False, date_extraction=True, workers=1, stage_callback=None):
     """Extracts and returns the index of a single pdf file using existing ocr.
 
     Parameters
@@ -157,40 +404,43 @@ def extract_indexes_pdf(pdf_path, start_page=1, remove_wrong=False, verbose=True
         set True, if the country headlines are centered, by default False
     start_indented
         set True, if the first line of every index in this document is indented, by default False
+    workers, optional
+        number of processes that read the pages of the pdf in parallel, if smaller than 1: number of cpus, by default 1
+    stage_callback, optional
+        function that is called with the measurements of every stage of the extraction, see profiling.run_stage, by default None
 
     Returns
     -------
         index data frame
     """
-    pdf_words, pdf_dicts = util.read_pdf(pdf_path, start_page, verbose)
+    file_name = os.path.basename(pdf_path)
+
+    pdf_words, pdf_dicts = profiling.run_stage(stage_callback, file_name, "read_pdf", util.read_pdf, pdf_path, start_page, verbose, dicts=False, workers=workers) # dicts are only needed for make_lines_df_from_dicts
 
-    words_df = lines.make_words_df(pdf_words, start_page)
+    words_df = profiling.run_stage(stage_callback, file_name, "make_words_df", lines.make_words_df, pdf_words, start_page)
 
     lines_df = words_df.rename(columns={"text": "line_text"}) # make lines_df from words_df
-    lines_df["x0"] = [round(x, 2) for x in lines_df["x0"]]
-    lines_df["y0"] = [round(x, 2) for x in lines_df["y0"]]
-    lines_df["x1"] = [round(x, 2) for x in lines_df["x1"]]
-    lines_df["y1"] = [round(x, 2) for x in lines_df["y1"]]
+    lines_df[["x0", "y0", "x1", "y1"]] = lines_df[["x0", "y0", "x1", "y1"]].round(2)
     #lines_df = lines.make_lines_df_from_dicts(pdf_dicts, start_page) # make lines_df from pdf_dicts
-    lines_df = lines.merge_close_lines(lines_df)
-    lines_df = lines.remove_useless_lines(lines_df)
+    lines_df = profiling.run_stage(stage_callback, file_name, "merge_close_lines", lines.merge_close_lines, lines_df)
+    lines_df = profiling.run_stage(stage_callback, file_name, "remove_useless_lines", lines.remove_useless_lines, lines_df)
 
-    ind_df = extract_indexes(words_df, lines_df, file_name=os.path.basename(pdf_path), mode="fitz", remove_wrong=remove_wrong, verbose=verbose, double_paged=None, save_to=save_to, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction)
+    ind_df = extract_indexes(words_df, lines_df, file_name=file_name, mode="fitz", remove_wrong=remove_wrong, verbose=verbose, double_paged=None, save_to=save_to, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction, stage_callback=stage_callback)
 
     return ind_df
 
 
-def extract_indexes_tess(file_path, file_type="csv", start_page=1, remove_wrong=False, verbose=True, double_paged=None, save_to=None, country_centered=False, start_indented=False, tesseract_path=None, date_extraction=True):
-    """Extracts and returns the index of a single pdf file or a tesseract data frame saved as a csv file.
+def extract_indexes_tess(file_path, file_type="csv", start_page=1, remove_wrong=False, verbose=True, double_paged=None, save_to=None, country_centered=False, start_indented=False, tesseract_path=None, date_extraction=True, ocr_workers=None, ocr_cache=None, stage_callback=None, progress_log=None):
+    """Extracts and returns the index of a single pdf file or a tesseract data frame saved as a csv, feather or parquet file.
 
     If the file is a pdf, the tesseract engine is used to generate ocr.
 
     Parameters
     ----------
     file_path
-        path of the file, pdf or tesseract dataframe as csv file
+        path of the file, pdf or tesseract dataframe as csv, feather or parquet file
     file_type, optional
-        pdf or csv, by default "csv"
+        pdf, csv, feather or parquet, by default "csv"
     start_page, optional
         page from which the extraction should start, by default 1
     remove_wrong, optional
@@ -208,6 +458,14 @@ def extract_indexes_tess(file_path, file_type="csv", start_page=1, remove_wrong=
         set True, if the first line of every index in this document is indented, by default False
     tesseract_path, optional
         define path to tesseract executable, by default None
+    ocr_workers, optional
+        number of pages that are recognized in parallel by tesseract, if None or smaller than 1: number of cpus, by default None
+    ocr_cache, optional
+        if specified: directory where the tesseract ocr of pdf pages is cached and reused, by default None
+    stage_callback, optional
+        function that is called with the measurements of every stage of the extraction, see profiling.run_stage, by default None
+    progress_log, optional
+        function that is called with the name and the fields of every progress event of the ocr, see util.ocr, by default None
 
     Returns
     -------
@@ -218,27 +476,30 @@ def extract_indexes_tess(file_path, file_type="csv", start_page=1, remove_wrong=
     ValueError
         if file_type is not supported
     """
+    file_name = os.path.basename(file_path)
+
     file_type = re.sub("\.", "", file_type)
-    if file_type == "csv":
-        pdf_df = pd.read_csv(file_path)
+    if file_type in util.TESS_FORMATS:
+        pdf_df = profiling.run_stage(stage_callback, file_name, "read_tess_df", util.read_tess_df, file_path, start_page=start_page)
     elif file_type == "pdf":
-        pdf_df = util.ocr(file_path, verbose=verbose, tesseract_path=tesseract_path)
+        pdf_df = profiling.run_stage(stage_callback, file_name, "ocr", util.ocr, file_path, start_page=start_page, verbose=verbose, tesseract_path=tesseract_path, workers=ocr_workers, cache_dir=ocr_cache, progress_log=progress_log)
+        pdf_df = profiling.run_stage(stage_callback, file_name, "filter_tess_df", util.filter_tess_df, pdf_df, start_page)
     else:
         raise ValueError(f"{file_type} is not a supported file type.")
 
-    pdf_df = pdf_df.loc[pdf_df["page_num"] >= start_page]
-    lines_df = lines.make_lines_df_from_ocr(pdf_df)
+    lines_df = profiling.run_stage(stage_callback, file_name, "make_lines_df_from_ocr", lines.make_lines_df_from_ocr, pdf_df)
 
-    ind_df = extract_indexes(pdf_df, lines_df, file_name=os.path.basename(file_path), mode="tess", remove_wrong=remove_wrong, verbose=verbose, double_paged=double_paged, save_to=save_to, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction)
+    ind_df = extract_indexes(pdf_df, lines_df, file_name=file_name, mode="tess", remove_wrong=remove_wrong, verbose=verbose, double_paged=double_paged, save_to=save_to, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction, stage_callback=stage_callback)
 
     return ind_df
 
 
-def extract_indexes(words_df, lines_df, file_name, mode, verbose=True, double_paged=None, save_to=None, remove_wrong=False, country_centered=False, start_indented=False, date_extraction=True):
+def extract_indexes(words_df, lines_df, file_name, mode, verbose=True, double_paged=None, save_to=None, remove_wrong=False, country_centered=False, start_indented=False, date_extraction=True, stage_callback=None):
     """Extracts and returns index from the words data frame and the lines data frame of a document.
 
     Extraction works for single paged and double paged documents. In mode fitz, extraction does not work for double paged
     documents but double paged documents should be identified as such.
+    If stage_callback is specified, every stage of the extraction is measured and reported to it, see profiling.run_stage.
 
     Parameters
     ----------
@@ -263,6 +524,8 @@ def extract_indexes(words_df, lines_df, file_name, mode, verbose=True, double_pa
         set True, if the country headlines are centered, by default False
     start_indented
         set True, if the first line of every index in this document is indented, by default False
+    stage_callback, optional
+        function that is called with the measurements of every stage, by default None
 
     Returns
     -------
@@ -271,39 +534,42 @@ def extract_indexes(words_df, lines_df, file_name, mode, verbose=True, double_pa
     if verbose:
         print(f"Starting extraction for {file_name}...")
 
-    bins_x0, bins_x1, x0_n = group.group_line_starts_ends(lines_df, mode)
-    borders = lines.make_borders_df(bins_x0, bins_x1)
+    def run(stage, func, *args, **kwargs):
+        return profiling.run_stage(stage_callback, file_name, stage, func, *args, **kwargs)
+
+    bins_x0, bins_x1, x0_n = run("group_line_starts_ends", group.group_line_starts_ends, lines_df, mode)
+    borders = run("make_borders_df", lines.make_borders_df, bins_x0, bins_x1)
 
     if double_paged:
         if mode=="tess":
-            return extract_double_paged_indexes(words_df, borders, file_name, verbose=verbose, save_to=save_to, remove_wrong=remove_wrong, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction)
+            return extract_double_paged_indexes(words_df, borders, file_name, verbose=verbose, save_to=save_to, remove_wrong=remove_wrong, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction, stage_callback=stage_callback)
         else:
             print("Extraction for double paged documents only works in mode 'tess'. Extraction failed.")
             return None
 
     elif double_paged == None:
-        if is_double_paged(words_df, borders, mode):
+        if run("is_double_paged", is_double_paged, words_df, borders, mode):
 
             if mode=="tess":
-                return extract_double_paged_indexes(words_df, borders, file_name, verbose=verbose, save_to=save_to, remove_wrong=remove_wrong, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction)
+                return extract_double_paged_indexes(words_df, borders, file_name, verbose=verbose, save_to=save_to, remove_wrong=remove_wrong, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction, stage_callback=stage_callback)
             else:
                 print("Extraction for double paged documents only works in mode 'tess'. Extraction failed.")
                 return None
 
-    df = label.assign_types(lines_df, bins_x0, bins_x1, x0_n, country_centered)
-    df = label.assign_labels(df, x0_n, country_centered, start_indented)
+    df = run("assign_types", label.assign_types, lines_df, bins_x0, bins_x1, x0_n, country_centered, borders=borders)
+    df = run("assign_labels", label.assign_labels, df, x0_n, country_centered, start_indented)
 
-    ind_df, p_l, p_g = label.correct_x0_types(df, bins_x0, bins_x1, x0_n, mode)
-    ind_df = label.assign_labels(ind_df, x0_n, country_centered, start_indented)
-    ind_df = label.approve_correction(df, ind_df, p_l)
-    ind_df = label.improve_country_classification(ind_df)
+    ind_df, p_l, p_g = run("correct_x0_types", label.correct_x0_types, df, bins_x0, bins_x1, x0_n, mode)
+    ind_df = run("assign_labels", label.assign_labels, ind_df, x0_n, country_centered, start_indented)
+    ind_df = run("approve_correction", label.approve_correction, df, ind_df, p_l)
+    ind_df = run("improve_country_classification", label.improve_country_classification, ind_df)
 
-    ind_df = records.extract_records(ind_df, start_indented)
+    ind_df = run("extract_records", records.extract_records, ind_df, start_indented)
 
     if date_extraction:
-        ind_df = date.extract_dates(ind_df, file_name)
+        ind_df = run("extract_dates", date.extract_dates, ind_df, file_name)
 
-    ind_df = clean_text(ind_df)
+    ind_df = run("clean_text", clean_text, ind_df)
 
     if remove_wrong & date_extraction:
         ind_df = ind_df.loc[ind_df["extracted_date"]!=""]
@@ -320,7 +586,7 @@ def extract_indexes(words_df, lines_df, file_name, mode, verbose=True, double_pa
     return ind_df
 
 
-def extract_double_paged_indexes(words_df, borders, file_name, save_to=None, mode="tess", verbose=True, remove_wrong=False, country_centered=False, start_indented=False, date_extraction=True):
+def extract_double_paged_indexes(words_df, borders, file_name, save_to=None, mode="tess", verbose=True, remove_wrong=False, country_centered=False, start_indented=False, date_extraction=True, stage_callback=None):
     """Extracts and returns index of a double paged document.
 
     Parameters
@@ -337,6 +603,8 @@ def extract_double_paged_indexes(words_df, borders, file_name, save_to=None, mod
         mode of operation, "fitz" or "tess", by default "tess", does not really work in mode "fitz"
     verbose, optional
         print infos, by default True
+    stage_callback, optional
+        function that is called with the measurements of every stage of the extraction, see profiling.run_stage, by default None
 
     Returns
     -------
@@ -352,7 +620,7 @@ def extract_double_paged_indexes(words_df, borders, file_name, save_to=None, mod
     if mode=="tess":
         df = df.rename(columns={"left": "x0", "top": "y0", "page_num": "page"})
 
-    mean_dx = lines.get_mean_dx(words_df, borders, mode)
+    mean_dx = profiling.run_stage(stage_callback, file_name, "get_mean_dx", lines.get_mean_dx, words_df, borders, mode)
 
     for p, b in borders.groupby("page"):
         middle = b.iloc[0]["x0"] + mean_dx/2
@@ -364,11 +632,11 @@ def extract_double_paged_indexes(words_df, borders, file_name, save_to=None, mod
         pdf_l = pd.concat([pdf_l, l])
         pdf_r = pd.concat([pdf_r, r])
 
-    lines_l = lines.make_lines_df_from_ocr(pdf_l)
-    lines_r = lines.make_lines_df_from_ocr(pdf_r)
+    lines_l = profiling.run_stage(stage_callback, file_name, "make_lines_df_from_ocr", lines.make_lines_df_from_ocr, pdf_l)
+    lines_r = profiling.run_stage(stage_callback, file_name, "make_lines_df_from_ocr", lines.make_lines_df_from_ocr, pdf_r)
 
-    ind_l = extract_indexes(None, lines_l, file_name, mode, verbose=False, double_paged=False, remove_wrong=remove_wrong, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction)
-    ind_r = extract_indexes(None, lines_r, file_name, mode, verbose=False, double_paged=False, remove_wrong=remove_wrong, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction)
+    ind_l = extract_indexes(None, lines_l, file_name, mode, verbose=False, double_paged=False, remove_wrong=remove_wrong, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction, stage_callback=stage_callback)
+    ind_r = extract_indexes(None, lines_r, file_name, mode, verbose=False, double_paged=False, remove_wrong=remove_wrong, country_centered=country_centered, start_indented=start_indented, date_extraction=date_extraction, stage_callback=stage_callback)
 
     idx_s = ind_l.shape[0]
     idx_e = idx_s + ind_r.shape[0]
@@ -441,9 +709,16 @@ def is_double_paged(words_df, borders, mode):
     return False
 
 
+CLEAN_START_REGEX = re.compile("^[^a-zA-Z0-9]+") # non alphanumeric characters in the beginning
+CLEAN_END_REGEX = re.compile("[ .;,+]*[.;,+] *$") # punctuation in the end, same as "( *[\.;,+] *)+$" without backtracking
+CLEAN_SPACES_REGEX = re.compile(" {2,}")
+
+
 def clean_text(ind_df):
     """Cleans up the index texts a little bit.
 
+    The cleanup is applied to all texts at once with the precompiled regexes.
+
     Parameters
     ----------
     ind_df
@@ -454,19 +729,12 @@ def clean_text(ind_df):
         index data frame
     """    
     df = ind_df.copy()
+    if df.empty:
+        return df
 
-    reg_s = "^[^a-zA-Z0-9]+"
-    reg_w = " {2,}"
-    reg_p = "( *[\.;,+] *)+$"
-
-    for i, row in df.iterrows():
-        t = row["text"]
-
-        t = re.sub(reg_s, "", t)
-        t = re.sub(reg_p, "", t)
-        t = re.sub(reg_w, " ", t)
-
-        t = t.strip()
-        df.loc[i, "text"] = t
+    df["text"] = df["text"].str.replace(CLEAN_START_REGEX, "", regex=True) \
+        .str.replace(CLEAN_END_REGEX, "", regex=True) \
+        .str.replace(CLEAN_SPACES_REGEX, " ", regex=True) \
+        .str.strip()
 
     return df
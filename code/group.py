@@ -3,11 +3,76 @@
 import pandas as pd
 import numpy as np
 import re
+import bisect
 
 import util
 import lines
 
 
+def bin_rows(values, d):
+    """Sorts values into bins of similar values, the algorithm of group_rows.
+
+    A value is added to the oldest bin whose mean is at most d away from it, otherwise a new bin is created.
+    Because the bins are chosen by age and their means change while values are added, the values cannot
+    be sorted and swept once. Instead the means of the bins are kept in a sorted list, so only the bins whose
+    mean is close to the value have to be checked, not all bins.
+
+    Parameters
+    ----------
+    values
+        list of values
+    d
+        max difference between the mean of a bin and a value to be added to the bin
+
+    Returns
+    -------
+        lists with one element per bin in the order the bins were created: values, positions of the
+        values in the input list, last two values, mean of the last two values, quantity of values
+    """
+    bin_values, positions, lasts, means, counts = [], [], [], [], []
+    sorted_means, sorted_bins = [], [] # means of the bins in ascending order and the bins they belong to
+
+    for pos, x in enumerate(values):
+        b = None
+        if x == x: # nan never fits into a bin
+            eps = 1e-9 * (abs(x) + d + 1) # the exact condition is checked below, the search range only has to include all candidates
+            lo = bisect.bisect_left(sorted_means, x - d - eps)
+            hi = bisect.bisect_right(sorted_means, x + d + eps)
+
+            fits = [sorted_bins[j] for j in range(lo, hi) if (means[sorted_bins[j]]-d <= x) & (means[sorted_bins[j]]+d >= x)]
+            if len(fits) > 0:
+                b = min(fits) # oldest bin the value fits into
+                b_j = sorted_bins.index(b, lo, hi)
+
+        if b == None:
+            bin_values.append([x])
+            positions.append([pos])
+            lasts.append([x])
+            means.append(x)
+            counts.append(1)
+            b = len(means) - 1
+        else:
+            bin_values[b].append(x)
+            positions[b].append(pos)
+            counts[b] += 1
+
+            if len(lasts[b]) >= 2:
+                lasts[b].pop(0)
+            lasts[b].append(x)
+
+            means[b] = sum(lasts[b]) / len(lasts[b])
+
+            del sorted_means[b_j]
+            del sorted_bins[b_j]
+
+        if means[b] == means[b]:
+            j = bisect.bisect_left(sorted_means, means[b])
+            sorted_means.insert(j, means[b])
+            sorted_bins.insert(j, b)
+
+    return bin_values, positions, lasts, means, counts
+
+
 def group_rows(df, by, mode=None, d=0):
     """Sorts the rows into bins containing rows with similar values for the specified parameter.
 
@@ -15,7 +80,7 @@ def group_rows(df, by, mode=None, d=0):
     can be sorted into, it is added to the bin. Otherwise, a new bin is created and the row is added
     to the new bin. 
     To determine wheter a row fits into a bin, the mean value of the last two rows that have been added
-    to the bin is compared to the value of the current row.
+    to the bin is compared to the value of the current row, see bin_rows.
 
     Parameters
     ----------
@@ -42,35 +107,17 @@ def group_rows(df, by, mode=None, d=0):
 
     last = "last_" + by
     last_m = last + "_mean"
-    bins = pd.DataFrame(columns=[by, "lines", last, last_m, "count"])
-
-    for index, row in df.iterrows():
-        x0 = row[by]
-        poss_bin = bins.loc[(bins[last_m]-d <= x0) & (bins[last_m]+d >= x0)]
-
-        if poss_bin.empty:
-            new_row = pd.DataFrame({
-                by: [[x0]],
-                "lines": [[index]],
-                last: [[x0]],
-                last_m: [x0],
-                "count": 1
-            })
-            bins = pd.concat([new_row, bins.loc[:]]).reset_index(drop=True)
-        else:
-            b = bins.iloc[poss_bin.index[-1]].copy()
 
-            b[by].append(x0)
-            b["lines"].append(index)
-            b["count"] += 1
+    values, positions, lasts, means, counts = bin_rows(df[by].tolist(), d)
+    index = df.index.tolist()
 
-            if len(b[last]) >= 2:
-                b[last].pop(0)
-            b[last].append(x0)
-
-            last_mean = sum(b[last]) / len(b[last])
-            b[last_m] = last_mean
-            bins.loc[b.name] = b
+    bins = pd.DataFrame({ # newest bin first
+        by: values[::-1],
+        "lines": [[index[p] for p in pos] for pos in positions[::-1]],
+        last: lasts[::-1],
+        last_m: means[::-1],
+        "count": counts[::-1]
+    }, columns=[by, "lines", last, last_m, "count"], dtype=object)
 
     return bins
 
@@ -78,6 +125,8 @@ def group_rows(df, by, mode=None, d=0):
 def get_line_start_end_bins(lines_df, mode):
     """Creates bins for the lines based on their x0 and x1 coordinates individually for every page.
 
+    The bins of all pages are collected in lists, the data frames are only created once at the end.
+
     Parameters
     ----------
     lines_df
@@ -89,19 +138,30 @@ def get_line_start_end_bins(lines_df, mode):
     -------
         bins created based on similarity of x0, bins created based on similarity of x1, most common quantity of x0 bins per page (2 or 3)
     """    
-    df = lines_df.copy()
+    d = 0
+    if mode=="fitz":
+        d = 4
+    elif mode=="tess":
+        d = 20
+
+    bins = {}
+    for by in ["x0", "x1"]:
+        columns = {by: [], "lines": [], "last_" + by: [], "last_" + by + "_mean": [], "count": []}
+        pages, bin_index = [], []
 
-    bins_x0 = pd.DataFrame(columns=["x0", "lines", "last_x0", "last_x0_mean", "count", "page"])
-    bins_x1 = pd.DataFrame(columns=["x1", "lines", "last_x1", "last_x1_mean", "count", "page"])
+        for page, frame in lines_df.groupby("page"):
+            values, positions, lasts, means, counts = bin_rows(frame[by].tolist(), d)
+            index = frame.index.tolist()
 
-    for page, frame in df.groupby("page"):
-        b = group_rows(frame, "x0", mode)
-        b["page"] = page
-        bins_x0 = pd.concat([bins_x0, b])
+            for col, l in zip(columns.values(), [values, [[index[p] for p in pos] for pos in positions], lasts, means, counts]):
+                col += l[::-1] # newest bin first
+            pages += [page] * len(counts)
+            bin_index += range(len(counts))
 
-        c = group_rows(frame, "x1", mode)
-        c["page"] = page
-        bins_x1 = pd.concat([bins_x1, c])
+        bins[by] = pd.DataFrame(columns, index=bin_index, dtype=object)
+        bins[by]["page"] = pd.Series(pages, index=bin_index, dtype=object)
+
+    bins_x0, bins_x1 = bins["x0"], bins["x1"]
 
     bins_x1 =  bins_x1.sort_values(by=["page", "last_x1_mean"], ascending=[True, False])
 
@@ -136,18 +196,20 @@ def get_relevant_x0_bins(bins_x0, x0_n, drop_first=False):
         bins x0 data frame
     """    
 
-    bins_x0_rel = pd.DataFrame(columns=bins_x0.columns)
+    parts = [pd.DataFrame(columns=bins_x0.columns)] # concatenated once at the end
     for p_no, p in bins_x0.groupby("page"):
         x = p.sort_values(by="last_x0_mean")
 
         if drop_first:
             x = x.drop(x.iloc[0].name)
 
-        bins_x0_rel = pd.concat([bins_x0_rel, x.iloc[0:1]]) # add lines that start by the left text border
+        parts.append(x.iloc[0:1]) # add lines that start by the left text border
 
         z = x.drop(x.iloc[0].name)
         z = z.sort_values(by="count", ascending=False).iloc[0:x0_n-1].sort_values(by="last_x0_mean")
-        bins_x0_rel = pd.concat([bins_x0_rel, z]) # add the other x0_n-1 bins
+        parts.append(z) # add the other x0_n-1 bins
+
+    bins_x0_rel = pd.concat(parts)
 
     return bins_x0_rel
 
@@ -173,11 +235,13 @@ def group_line_starts_ends(lines_df, mode):
 
     bins_x0, bins_x1, x0_n = get_line_start_end_bins(df, mode)
 
-    bins_x1_max = pd.DataFrame()
+    parts = [pd.DataFrame()] # concatenated once at the end
     for p_no, frame in bins_x1.groupby("page"):
 
         p_x1_max = frame.sort_values(by="count", ascending=False).iloc[0:1]
-        bins_x1_max = pd.concat([bins_x1_max, p_x1_max]) # all lines that end by the right text border
+        parts.append(p_x1_max) # all lines that end by the right text border
+
+    bins_x1_max = pd.concat(parts)
 
 
     bins_x0_rel = get_relevant_x0_bins(bins_x0, x0_n)
@@ -9,10 +9,12 @@ import lines
 import group
 
 
-def assign_types(lines_df, bins_x0_df, bins_x1_df, x0_n, country_centered=False):
+def assign_types(lines_df, bins_x0_df, bins_x1_df, x0_n, country_centered=False, borders=None):
     """Assigns types for x0 and types for x1 coordinates of individual lines. 
     
     Based on the x0 and x1 bins they were sorted into. Types are later used for labeling.
+    The types are assigned to all lines of the document at once by joining the lines with the
+    borders of their page.
 
     Parameters
     ----------
@@ -24,6 +26,10 @@ def assign_types(lines_df, bins_x0_df, bins_x1_df, x0_n, country_centered=False)
         bins x1 data frame
     x0_n
         quantity of x0 types (2 or 3)
+    country_centered
+        set True, if the country headlines are centered, by default False
+    borders, optional
+        borders data frame created from bins_x0_df and bins_x1_df, if None it is created, by default None
 
     Returns
     -------
@@ -45,34 +51,27 @@ def assign_types(lines_df, bins_x0_df, bins_x1_df, x0_n, country_centered=False)
             if i < p.shape[0]:
                 df.loc[p.iloc[i]["lines"], "x0_type"] = i
 
-    borders = lines.make_borders_df(bins_x0, bins_x1)
+    if not isinstance(borders, pd.DataFrame):
+        borders = lines.make_borders_df(bins_x0, bins_x1)
+    borders = borders.set_index("page")
     
     # assign x0_type 4: lines that do not have a type yet and start in the first half of the text page
-    for i, b in borders.iterrows():
-        text_middle = b["x0"] + b["dx"]/2
-        df.loc[(df["page"]==b["page"]) & (df["x0"]<text_middle) & (df["x0_type"]==-1), "x0_type"] = 4
+    text_middle = df["page"].map(borders["x0"] + borders["dx"]/2)
+    df.loc[(df["x0"]<text_middle) & (df["x0_type"]==-1), "x0_type"] = 4
 
     # assign x1_type to lines
-    for p_no, p in df.groupby("page"):
-        max_x1 = bins_x1.loc[bins_x1["page"]==p_no]["lines"].values[0]
-        if type(max_x1) is not list:
-            max_x1 = [max_x1]
-
-        for index, row in p.iterrows():
-            x1_type = -1
-
-            if index in max_x1:
-                x1_type = 2 # line ends by the right text border
-            else:
-                l_x1 = row["x1"]
-                
-                borders_p =borders.loc[borders["page"]==p_no]
-                if l_x1 < borders_p["x0"].values[0] + 0.7*(borders_p["x1"].values[0] - borders_p["x0"].values[0]):
-                    x1_type = 0 # line ends before the first 0.7 text width
-                else:
-                    x1_type = 1 # line ends after the first 0.7 text width but before the border
-
-            df.loc[index, "x1_type"] = x1_type
+    max_x1 = bins_x1.loc[~bins_x1["page"].duplicated(), "lines"] # first x1 bin of every page
+    max_x1 = util.flatten([l if type(l) is list else [l] for l in max_x1])
+
+    text_width_07 = df["page"].map(borders["x0"] + 0.7*(borders["x1"] - borders["x0"]))
+
+    df["x1_type"] = np.where(
+        df.index.isin(max_x1), 2, # line ends by the right text border
+        np.where(df["x1"] < text_width_07,
+            0, # line ends before the first 0.7 text width
+            1 # line ends after the first 0.7 text width but before the border
+        )
+    )
 
     return df
 
@@ -185,6 +184,7 @@ def assign_labels(lines_df, x0_n, country_centered=False, start_indented=False):
     """Based on x0 and x1 types of the lines, labels are assigned to each line.
 
     Labels are: country, start, middle, end.
+    The labels are assigned to all lines in a single pass.
 
     Parameters
     ----------
@@ -212,30 +212,28 @@ def assign_labels(lines_df, x0_n, country_centered=False, start_indented=False):
     if x0_n == 2:
         x0_start = 0
     
-    for index, row in df.iterrows():
-        x0_t = row["x0_type"]
-        x1_t = row["x1_type"]
-        
-        if country_centered:
-            df.loc[(df["x0_type"]==4) & (df["x1_type"]<2), "label"] = "country"
-        else:
-            if x0_n==2:
-                df.loc[(df["x0_type"]==0) & (df["x1_type"]==0), "label"] = "country"  
-            elif x0_n==3:
-                df.loc[(df["x0_type"]==0) & (df["x1_type"]<2), "label"] = "country"                
-        
-        if start_indented:
-            df.loc[(df["x0_type"]==1), "label"] = "start"
-            df.loc[(df["x0_type"]==0) & (df["x1_type"]==2), "label"] = "middle"
-            df.loc[(df["x0_type"]==0) & (df["x1_type"]<2), "label"] = "end"
-        else:
-            if x0_n==2:
-                df.loc[(df["x0_type"]==x0_start) & (df["x1_type"]>0), "label"] = "start"
-            elif x0_n==3:
-                df.loc[(df["x0_type"]==x0_start), "label"] = "start"
-
-            df.loc[(df["x0_type"]==x0_start+1) & (df["x1_type"]==2), "label"] = "middle"
-            df.loc[(df["x0_type"]==x0_start+1) & (df["x1_type"]<2), "label"] = "end"
+    # the labels only depend on the x0 and x1 types, so they are assigned to all lines at once,
+    # later assignments overwrite earlier ones
+    if country_centered:
+        df.loc[(df["x0_type"]==4) & (df["x1_type"]<2), "label"] = "country"
+    else:
+        if x0_n==2:
+            df.loc[(df["x0_type"]==0) & (df["x1_type"]==0), "label"] = "country"  
+        elif x0_n==3:
+            df.loc[(df["x0_type"]==0) & (df["x1_type"]<2), "label"] = "country"                
+    
+    if start_indented:
+        df.loc[(df["x0_type"]==1), "label"] = "start"
+        df.loc[(df["x0_type"]==0) & (df["x1_type"]==2), "label"] = "middle"
+        df.loc[(df["x0_type"]==0) & (df["x1_type"]<2), "label"] = "end"
+    else:
+        if x0_n==2:
+            df.loc[(df["x0_type"]==x0_start) & (df["x1_type"]>0), "label"] = "start"
+        elif x0_n==3:
+            df.loc[(df["x0_type"]==x0_start), "label"] = "start"
+
+        df.loc[(df["x0_type"]==x0_start+1) & (df["x1_type"]==2), "label"] = "middle"
+        df.loc[(df["x0_type"]==x0_start+1) & (df["x1_type"]<2), "label"] = "end"
 
     return df
 
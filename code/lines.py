@@ -2,18 +2,27 @@
 that is used for the index extraction."""
 
 import pandas as pd
+import numpy as np
 import re
 
 import util
 import group
 
 
+MEANINGFUL_TEXT_REGEX = re.compile("[a-zA-Z0-9]")
+
+
 def make_lines_df_from_ocr(pdf_df):
     """Makes a lines data frame from a tesseract data frame.
 
     The method tries to filter out artifacts that are on the page before a line starts.
     Tesseract usually recognizes these artifacts as characters.
 
+    The words are assigned to their line (page, block, paragraph, line) and all lines
+    are built at once with grouped aggregations. Words at the beginning of a line that only
+    consist of artifacts are skipped, the artifacts of the first word with actual text are cut off
+    and x0 of the line is shifted proportionally to the length of the artifacts.
+
     Parameters
     ----------
     pdf_df
@@ -23,83 +32,49 @@ def make_lines_df_from_ocr(pdf_df):
     -------
         lines data frame with: the text of each line, its bounding box coordinates,
         the page number
-    """    
-    df = pdf_df.copy()
-
-    df = df.dropna(subset=["text"])
+    """
+    df = pdf_df.dropna(subset=["text"])
     df = df.rename(columns={"left": "x0", "top": "y0", "page_num": "page"})
     df["x1"] = df["x0"] + df["width"]
     df["y1"] = df["y0"] + df["height"]
-    
+
     arts = "[.,;:'`#\+\-\"„”_ ]"
     reg_art = "^" + arts + "*([oeau]{2,})?" + arts + "*"   # regex for artifacts
 
-    page, lines_text, x0, x1, y0, y1 = [], [], [], [], [], []
-    art = []
-
-    for p_no, page_frame in df.groupby("page"):
-        for b, block in page_frame.groupby("block_num"):
-            for p, par in block.groupby("par_num"):
-                for no, line in par.groupby("line_num"):
-
-                    art_text = ""
-                    artifact_start = True
-
-                    line_text = ""
-                    l_x0 = 0
-                    l_y0 = 0
-
-                    for i, word in line.iterrows():
-
-                        if artifact_start: # to filter out artifacts in the beginning of a line
-                            a = re.search(reg_art, word["text"])
-                            if a != None:
-                                art_text += a.group()
-                                rest = re.sub(reg_art, "", word["text"])
-
-                                if len(rest.strip()) == 0:
-                                    if i+1 in line.index:
-                                        l_x0 = line.loc[i+1]["x0"]
-                                        l_y0 = line.loc[i+1]["y0"]
-                                else:
-                                    line_text += rest + " "
-                                    word_len = len(word["text"])
-                                    art_len = len(art_text)/2
-                                    l_x0 = int(word["x0"] + (word["x1"] - word["x0"]) * art_len/word_len)
-                                    artifact_start = False
+    df["line_no"] = df.groupby(["page", "block_num", "par_num", "line_num"], sort=True).ngroup()
+    df = df.sort_values("line_no", kind="mergesort") # keeps the order of the words within a line
+    line_no = df["line_no"]
 
-                                continue
+    text = df["text"].astype(str)
+    art = text.str.extract("(" + reg_art + ")", expand=True)[0] # artifacts in the beginning of a word
+    rest = text.str.replace(reg_art, "", regex=True)
+    has_text = rest.str.strip().str.len() > 0
 
-                            artifact_start = False
-                            if l_x0 == 0:
-                                l_x0 = word["x0"]
+    art_start = (has_text.groupby(line_no).cumsum() - has_text) == 0 # words up to the first word with text
+    first_word = art_start & has_text
 
-                        line_text += word["text"] + " "
+    art_text = util.join_groups(art.where(art_start, ""), line_no, sep="")
+    art_len = art.str.len().where(art_start, 0).groupby(line_no).cumsum() / 2
 
-                    line_text = line_text.strip()
+    words = text.where(~first_word, rest).loc[~art_start | first_word]
+    lines_text = util.join_groups(words, line_no.loc[words.index]).str.strip()
 
-                    l_x1 = line["x1"].max()
-                    l_y0 = line["y0"].min()
-                    l_y1 = line["y1"].max()
+    first = df.loc[first_word]
+    x0 = first["x0"] + (first["x1"] - first["x0"]) * art_len.loc[first.index] / text.loc[first.index].str.len()
+    x0 = pd.Series(x0.astype(int).values, index=first["line_no"].values)
 
-                    if len(line_text) > 2:
-                        art.append(art_text)
-                        lines_text.append(line_text)
-                        page.append(p_no)
-                        x0.append(l_x0)
-                        x1.append(l_x1)
-                        y0.append(l_y0)
-                        y1.append(l_y1)
+    bounds = df.groupby("line_no").agg(x1=("x1", "max"), y0=("y0", "min"), y1=("y1", "max"), page=("page", "first"))
 
     lines_df = pd.DataFrame({
         "line_text": lines_text,
-        "artifact_text": art,
-        "x0": x0,
-        "y0": y0,
-        "x1": x1,
-        "y1": y1,
-        "page": page
-    })
+        "artifact_text": art_text.loc[lines_text.index],
+        "x0": x0.loc[lines_text.index],
+        "y0": bounds["y0"].loc[lines_text.index],
+        "x1": bounds["x1"].loc[lines_text.index],
+        "y1": bounds["y1"].loc[lines_text.index],
+        "page": bounds["page"].loc[lines_text.index]
+    }, columns=["line_text", "artifact_text", "x0", "y0", "x1", "y1", "page"])
+    lines_df = lines_df.loc[lines_df["line_text"].str.len() > 2].reset_index(drop=True)
     lines_df["dx"] = lines_df["x1"] - lines_df["x0"]
 
     lines_df = remove_useless_lines(lines_df)
@@ -110,11 +85,13 @@ def make_lines_df_from_ocr(pdf_df):
 def make_words_df(words_list, start_page=1):
     """Makes a words data frame from a list of words.
 
+    The word tuples of all pages are converted to numpy arrays at once.
+
     Parameters
     ----------
     words_list
-        list of list of words, one list per page,
-        is returned by util.read_pdf
+        list or iterable of list of words, one list per page,
+        is returned by util.read_pdf or util.iter_pdf
     start_page, optional
         start page chosen for reading of pdf, by default 1
 
@@ -123,23 +100,23 @@ def make_words_df(words_list, start_page=1):
         words data frame with: text of the word, bounding box coordinates,
         page number
     """
-    page, words, x0, y0, x1, y1 = [], [], [], [], [], []
+    counts = []
+    words = []
+    for p in words_list:
+        counts.append(len(p))
+        words.extend(p)
 
-    for i, p in enumerate(words_list):
-        for w in p:
-            page.append(i+start_page)
-            words.append(w[4])
-            x0.append(w[0])
-            y0.append(w[1])
-            x1.append(w[2])
-            y1.append(w[3])
+    page = np.repeat(np.arange(start_page, start_page + len(counts)), counts)
+
+    words = np.array(words, dtype=object).reshape(-1, 8)
+    coords = words[:, :4].astype(np.float64)
 
     words_df = pd.DataFrame({
-        "text": words,
-        "x0": x0,
-        "y0": y0,
-        "x1": x1,
-        "y1": y1,
+        "text": words[:, 4],
+        "x0": coords[:, 0],
+        "y0": coords[:, 1],
+        "x1": coords[:, 2],
+        "y1": coords[:, 3],
         "page": page
     })
 
@@ -192,11 +169,12 @@ def make_lines_df_from_dicts(dicts, page_start=1):
     return lines_df
 
 
-def merge_close_lines(lines_df, distance=4):
+def merge_close_lines(lines_df, distance=4, spans=False):
     """Merges lines that are close to each other into one line.
 
     When the y0 coordinate of a line is within the range of the
     y0 coordinate of the previous line, the lines are merged.
+    All lines are merged at once with a single grouped aggregation.
 
     Parameters
     ----------
@@ -205,54 +183,35 @@ def merge_close_lines(lines_df, distance=4):
     distance, optional
         min y0 distance that should exist between lines, defines the range in which close lines
         are merged, by default 4
+    spans, optional
+        set True to add a column spans with the list of texts that were merged into each line, by default False
 
     Returns
     -------
         lines data frame
     """
-    df = lines_df.copy()
-    df["dy"] = df["y0"].diff(periods=1).abs()
-    df["line_no"] = df["dy"].gt(distance).cumsum()
-
-    lines = []
-    line_spans = []
-    x0 = []
-    y0 = []
-    x1 = []
-    y1 = []
-    page_no = []
-
-    for l in df.groupby("line_no"):
-        line = []
+    line_no = lines_df["y0"].diff(periods=1).abs().gt(distance).cumsum().values
 
-        for r in l[1].iterrows():
-            line.append(r[1]["line_text"])
+    blines_df = lines_df.groupby(line_no, sort=True).agg(
+        line_text=("line_text", " ".join),
+        x0=("x0", "min"),
+        y0=("y0", "min"),
+        x1=("x1", "max"),
+        y1=("y1", "max"),
+        page=("page", "last")
+    )
 
-        lines.append(" ".join(line))
-        line_spans.append(line)
+    if spans:
+        blines_df.insert(1, "spans", lines_df.groupby(line_no, sort=True)["line_text"].agg(list))
 
-        x0.append(l[1]["x0"].min())
-        y0.append(l[1]["y0"].min())
-        x1.append(l[1]["x1"].max())
-        y1.append(l[1]["y1"].max())
-        page_no.append(r[1]["page"])
-
-    blines_df = pd.DataFrame({
-        "line_text": lines,
-        "spans": line_spans,
-        "x0": x0,
-        "y0": y0,
-        "x1": x1,
-        "y1": y1,
-        "page": page_no
-    })
-
-    return blines_df
+    return blines_df.reset_index(drop=True)
 
 
 def remove_useless_lines(lines_df):
     """Removes lines in a data frame that do not contain any meaningful text.
 
+    Lines are kept if they contain at least one letter or digit, all lines are checked at once.
+
     Parameters
     ----------
     lines_df
@@ -262,14 +221,10 @@ def remove_useless_lines(lines_df):
     -------
         lines data frame
     """
-    dumb_lines = []
-    for row in lines_df.iterrows():
-        if not re.search("[a-zA-Z0-9]", row[1]["line_text"]):
-            dumb_lines.append(row[0])
-
-    blines_df = lines_df.drop(dumb_lines)
+    if lines_df.empty:
+        return lines_df.copy()
 
-    return blines_df
+    return lines_df.loc[lines_df["line_text"].str.contains(MEANINGFUL_TEXT_REGEX, regex=True)].copy() # a new frame like drop, not a view of lines_df
 
 
 
@@ -1,9 +1,13 @@
 """This script implements the command line tool for the index extraction."""
 
 import argparse
+import cProfile
 import os
+import pstats
 
 import extract
+import profiling
+import progress
 
 def defineArgumentParser():
     """Defines the arguments of the command line tool.
@@ -24,6 +28,14 @@ def defineArgumentParser():
     parser.add_argument("-c", "--country_centered", help="only works when input path is a file, country headlines in this document are centered", action="store_true", default=False)
     parser.add_argument("-s", "--start_indented", help="only works when input path is a file, the first line of an index is indented in this document", action="store_true", default=False)
     parser.add_argument("-t", "--tesseract_path", help="define path to tesseract executable")
+    parser.add_argument("-w", "--ocr_workers", type=int, help="number of pages that are recognized in parallel by tesseract, 0 uses all cpus, default is the number of cpus, divided by the number of jobs if input path is a directory")
+    parser.add_argument("-o", "--ocr_cache", help="directory where the tesseract ocr of pdf pages is cached, pages that have already been recognized with the same settings are not recognized again")
+    parser.add_argument("-f", "--fitz_workers", type=int, help="only in mode FITZ, number of processes that read the pages of a pdf in parallel, 0 uses all cpus", default=1)
+    parser.add_argument("-j", "--jobs", type=int, help="only when input path is a directory, number of files that are extracted in parallel, 0 uses all cpus", default=1)
+    parser.add_argument("-i", "--incremental", help="only when input path is a directory, skip files that have already been extracted to the output directory from the same input with the same settings and code version, a manifest of the extracted files is kept in the output directory", action="store_true", default=False)
+    parser.add_argument("--profile", help="path of a file the cProfile statistics of the extraction are written to, also prints the duration, rows and memory change of every stage of the extraction, only works with one job")
+    parser.add_argument("--events", help="path of a file the progress of the extraction is written to as json lines (files and pages done and in flight, pages and files per second, estimated remaining time, durations of the stages of every file), - writes to stderr")
+    parser.add_argument("--summary", help="only when input path is a directory, path of a json file a summary of the extraction is written to at the end")
 
     return parser.parse_args()
 
@@ -35,9 +47,31 @@ if __name__=="__main__":
     if args.mode != None:
         m = str.lower(args.mode)
 
+    if (args.profile != None) & (args.jobs != 1) & os.path.isdir(args.input_path):
+        print("Profiling only works with one job, the extraction is not profiled.")
+        args.profile = None
+
+    collector = None
+    if args.profile != None:
+        collector = profiling.StageCollector()
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    progress_log = None
+    if args.events != None:
+        progress_log = progress.ProgressLog(args.events)
+
     if os.path.isdir(args.input_path):
-        extract.extract_indexes_dir(args.input_path, args.output_dir, verbose=args.verbose, remove_wrong=not args.keep_all, mode=m, recursive=args.recursive, tesseract_path=args.tesseract_path)
+        extract.extract_indexes_dir(args.input_path, args.output_dir, verbose=args.verbose, remove_wrong=not args.keep_all, mode=m, recursive=args.recursive, tesseract_path=args.tesseract_path, jobs=args.jobs, ocr_workers=args.ocr_workers, ocr_cache=args.ocr_cache, fitz_workers=args.fitz_workers, stage_callback=collector, progress_log=progress_log, summary_path=args.summary, incremental=args.incremental)
     elif os.path.isfile(args.input_path):
-        extract.extract_indexes_file(args.input_path, args.output_dir, verbose=args.verbose, start_page=args.start_page, remove_wrong=not args.keep_all, mode=m, country_centered=args.country_centered, start_indented=args.start_indented, tesseract_path=args.tesseract_path)
+        extract.extract_indexes_file(args.input_path, args.output_dir, verbose=args.verbose, start_page=args.start_page, remove_wrong=not args.keep_all, mode=m, country_centered=args.country_centered, start_indented=args.start_indented, tesseract_path=args.tesseract_path, ocr_workers=args.ocr_workers, ocr_cache=args.ocr_cache, fitz_workers=args.fitz_workers, stage_callback=collector, progress_log=progress_log)
     else:
         print("Input path is not valid.")
+
+    if args.profile != None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+        print(collector.report())
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+        print(f"Saved profile to {args.profile}.")
@@ -0,0 +1,225 @@
+"""This script contains methods for the incremental extraction of directories. A manifest in the output
+directory records for every input file the content hash, the settings of the extraction, the version of
+the extraction code and the name of the output file, so files that did not change are not extracted again."""
+
+import datetime
+import functools
+import hashlib
+import json
+import os
+
+import pytesseract
+
+import util
+
+
+MANIFEST_NAME = ".extract_manifest.json"
+
+# minimum seconds between two writes of the manifest during an extraction, it is always written at the end
+SAVE_INTERVAL = 10
+
+# modules whose source code determines the extracted indexes
+CODE_MODULES = ["util", "lines", "group", "label", "records", "date", "extract"]
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Returns the version of the extraction code, a hash of the source code of CODE_MODULES.
+
+    Returns
+    -------
+        hex digest of the hash
+    """
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+
+    for m in CODE_MODULES:
+        with open(os.path.join(code_dir, m + ".py"), "rb") as f:
+            h.update(f.read())
+
+    return h.hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def tesseract_version(tesseract_path=None):
+    """Returns the version of the tesseract executable as string.
+
+    Parameters
+    ----------
+    tesseract_path, optional
+        path to tesseract executable, by default None
+
+    Returns
+    -------
+        version of tesseract
+    """
+    if tesseract_path:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_path
+
+    return str(pytesseract.get_tesseract_version())
+
+
+def resolve_mode(path, mode=None):
+    """Returns the mode a file is extracted with, the same way as extract.extract_indexes_file.
+
+    Parameters
+    ----------
+    path
+        path to file, pdf or tesseract data frame
+    mode, optional
+        mode of operation, "fitz" or "tess", if None it will be determined based on file type, by default None
+
+    Returns
+    -------
+        "fitz" or "tess"
+    """
+    if mode == None:
+        return "fitz" if os.path.splitext(path)[1] == ".pdf" else "tess"
+
+    return mode
+
+
+def output_name(path, mode=None):
+    """Returns the name of the csv file the index of a file is written to by extract.extract_indexes_file."""
+    f_name = os.path.splitext(os.path.basename(path))[0]
+    return f_name + f"_{resolve_mode(path, mode)}.csv"
+
+
+def load(output_dir):
+    """Loads the manifest of an output directory.
+
+    Parameters
+    ----------
+    output_dir
+        directory containing the extracted indexes
+
+    Returns
+    -------
+        dict with the entries of the manifest by path of the input file relative to the input directory,
+        empty if there is no valid manifest
+    """
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return {}
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read manifest {path}, all files are extracted: {e!r}")
+        return {}
+
+    return manifest.get("entries", {})
+
+
+def save(output_dir, entries):
+    """Writes the manifest of an output directory.
+
+    The file is replaced atomically, so an interrupted extraction does not leave an incomplete manifest.
+
+    Parameters
+    ----------
+    output_dir
+        directory containing the extracted indexes
+    entries
+        dict with the entries of the manifest by path of the input file relative to the input directory
+    """
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"entries": entries}, f, indent=2, sort_keys=True)
+
+    os.replace(tmp_path, path)
+
+
+def make_entry(path, mode=None, remove_wrong=True, tesseract_path=None, previous=None):
+    """Creates the manifest entry of an input file for the current settings and code.
+
+    The content of the file is only hashed if its size or modification time differs from the previous entry.
+
+    Parameters
+    ----------
+    path
+        path to file, pdf or tesseract data frame
+    mode, optional
+        mode of operation, "fitz" or "tess", if None it will be determined based on file type, by default None
+    remove_wrong, optional
+        True if index where no date could be extracted is removed, by default True
+    tesseract_path, optional
+        path to tesseract executable, its version is part of the settings if a pdf is extracted with mode tess, by default None
+    previous, optional
+        previous manifest entry of the file, by default None
+
+    Returns
+    -------
+        manifest entry
+    """
+    mode = resolve_mode(path, mode)
+    stat = os.stat(path)
+
+    if previous == None:
+        previous = {}
+
+    if (previous.get("size") == stat.st_size) & (previous.get("mtime_ns") == stat.st_mtime_ns):
+        input_hash = previous["hash"]
+    else:
+        input_hash = util.file_hash(path)
+
+    settings = {"mode": mode, "remove_wrong": remove_wrong}
+    if (mode == "tess") & (os.path.splitext(path)[1] == ".pdf"):
+        settings["tesseract"] = tesseract_version(tesseract_path)
+
+    return {
+        "input": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": input_hash,
+        "settings": settings,
+        "code_version": code_version(),
+        "output": output_name(path, mode)
+    }
+
+
+def is_up_to_date(previous, entry, output_dir):
+    """Checks if the index of a file has already been extracted from the same input with the same settings and code.
+
+    Parameters
+    ----------
+    previous
+        manifest entry of the last extraction, None if the file has not been extracted yet
+    entry
+        manifest entry for the current input, settings and code, see make_entry
+    output_dir
+        directory containing the extracted indexes
+
+    Returns
+    -------
+        True if the file does not have to be extracted again
+    """
+    if previous == None:
+        return False
+
+    for key in ["input", "hash", "settings", "code_version", "output"]:
+        if previous.get(key) != entry[key]:
+            return False
+
+    # no output file is written if no index could be extracted
+    return os.path.isfile(os.path.join(output_dir, entry["output"])) | (previous.get("rows") == None)
+
+
+def record(entries, key, entry, rows):
+    """Adds the entry of an extracted file to the manifest entries.
+
+    Parameters
+    ----------
+    entries
+        dict with the entries of the manifest by path of the input file relative to the input directory
+    key
+        path of the input file relative to the input directory
+    entry
+        manifest entry, see make_entry
+    rows
+        quantity of extracted records, None if no index could be extracted
+    """
+    entries[key] = {**entry, "rows": rows, "extracted": datetime.datetime.now().isoformat(timespec="seconds")}
@@ -0,0 +1,200 @@
+"""This script contains methods to measure the stages of the index extraction. Every stage that is run
+with run_stage is reported to a callback, StageCollector is a callback that collects the measurements."""
+
+import os
+import time
+
+import pandas as pd
+
+
+# highest peak resident set size before the last reset_peak_rss, so the peak of the whole process is not lost
+_max_peak_rss_mb = 0
+
+
+def current_rss_mb():
+    """Returns the current resident set size of this process.
+
+    Returns
+    -------
+        resident set size in MiB, None if it cannot be determined on this platform
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError): # no procfs, e.g. on windows or macOS
+        return None
+
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process since it started or since the last reset_peak_rss.
+
+    Returns
+    -------
+        peak resident set size in MiB, None if it cannot be determined on this platform
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024 # KiB
+    except (OSError, ValueError, IndexError): # no procfs, e.g. on windows or macOS
+        return None
+
+    return None
+
+
+def reset_peak_rss():
+    """Resets the peak resident set size of this process to the current resident set size,
+    so that the peak of the following stage can be measured with peak_rss_mb.
+
+    Returns
+    -------
+        True if the peak has been reset, False if this is not supported on this platform (only on linux)
+    """
+    global _max_peak_rss_mb
+
+    peak = peak_rss_mb()
+    if peak == None:
+        return False
+
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5") # resets the peak resident set size, see man proc
+    except OSError:
+        return False
+
+    _max_peak_rss_mb = max(_max_peak_rss_mb, peak)
+    return True
+
+
+def process_peak_rss_mb():
+    """Returns the peak resident set size of this process since it started, including the peaks before reset_peak_rss.
+
+    Returns
+    -------
+        peak resident set size in MiB, None if it cannot be determined on this platform
+    """
+    peak = peak_rss_mb()
+    if peak == None:
+        return None
+
+    return max(peak, _max_peak_rss_mb)
+
+
+def count_rows(obj):
+    """Returns the quantity of rows of the input or output of a stage.
+
+    Parameters
+    ----------
+    obj
+        data frame, tuple whose first element is a data frame or list of the words of the pages
+
+    Returns
+    -------
+        quantity of rows, None if obj contains no rows
+    """
+    if isinstance(obj, tuple):
+        obj = obj[0] if len(obj) > 0 else None
+
+    if isinstance(obj, pd.DataFrame):
+        return obj.shape[0]
+    elif isinstance(obj, list): # words of the pages returned by util.read_pdf
+        return sum(len(p) for p in obj)
+
+    return None
+
+
+def run_stage(callback, document, stage, func, *args, **kwargs):
+    """Runs a stage of the extraction and reports its measurements to callback.
+
+    The measurements are: duration in seconds, rows of the first data frame passed to the stage,
+    rows of the returned data frame, change of the resident set size in MiB and peak resident set size
+    during the stage in MiB. The peak includes transient allocations that are freed before the stage ends,
+    it is only measured on linux.
+
+    Parameters
+    ----------
+    callback
+        function that is called with a dict of the measurements, if None the stage is only run
+    document
+        name of the document
+    stage
+        name of the stage
+    func
+        function of the stage
+    args, kwargs
+        arguments for func
+
+    Returns
+    -------
+        return value of func
+    """
+    if callback == None:
+        return func(*args, **kwargs)
+
+    rows_in = None
+    for a in args:
+        if isinstance(a, pd.DataFrame):
+            rows_in = a.shape[0]
+            break
+
+    peak_reset = reset_peak_rss()
+    rss = current_rss_mb()
+    start = time.perf_counter()
+
+    result = func(*args, **kwargs)
+
+    duration = time.perf_counter() - start
+    rss_after = current_rss_mb()
+    peak = peak_rss_mb() if peak_reset else None
+
+    callback({
+        "document": document,
+        "stage": stage,
+        "duration": duration,
+        "rows_in": rows_in,
+        "rows_out": count_rows(result),
+        "memory_delta_mb": None if rss == None else rss_after - rss,
+        "peak_rss_mb": peak
+    })
+
+    return result
+
+
+class StageCollector:
+    """Callback for run_stage that collects the measurements of all stages."""
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def to_frame(self):
+        """Returns the measurements as a data frame with one row per stage run."""
+        return pd.DataFrame(self.records, columns=["document", "stage", "duration", "rows_in", "rows_out", "memory_delta_mb", "peak_rss_mb"])
+
+    def report(self):
+        """Returns a report of the measurements per document and stage, in the order the stages were run.
+
+        Returns
+        -------
+            report as string
+        """
+        df = self.to_frame()
+        if df.empty:
+            return "No stages measured."
+
+        report = df.groupby(["document", "stage"], sort=False).agg(
+            calls=("duration", "size"),
+            duration=("duration", "sum"),
+            rows_in=("rows_in", "sum"),
+            rows_out=("rows_out", "sum"),
+            memory_delta_mb=("memory_delta_mb", "sum"),
+            peak_rss_mb=("peak_rss_mb", "max")
+        )
+        report["share"] = report["duration"] / report.groupby(level="document")["duration"].transform("sum")
+
+        return report.to_string(float_format=lambda x: f"{x:.3f}")
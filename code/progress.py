@@ -0,0 +1,113 @@
+"""This script contains methods to report the progress of long extractions as structured events
+and to write a summary of a batch run."""
+
+import datetime
+import json
+import os
+import sys
+import time
+
+
+class ProgressLog:
+    """Writes progress events as json lines to a file or to stderr.
+
+    Every event is a json object with the time, the name of the event and its fields.
+    The file is opened in append mode for every event, so the log can be passed to worker
+    processes and events of several processes can be written to the same file.
+    """
+
+    def __init__(self, path=None):
+        """
+        Parameters
+        ----------
+        path, optional
+            path of the file the events are appended to, if None or "-": stderr, by default None
+        """
+        self.path = None if path == "-" else path
+
+    def __call__(self, event, **fields):
+        """Writes an event.
+
+        Parameters
+        ----------
+        event
+            name of the event
+        fields
+            fields of the event, must be serializable as json (other values are written as strings)
+        """
+        record = {"time": datetime.datetime.now().isoformat(timespec="milliseconds"), "event": event}
+        record.update(fields)
+        line = json.dumps(record, default=str) + "\n"
+
+        if self.path == None:
+            sys.stderr.write(line)
+            sys.stderr.flush()
+        else:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class Throughput:
+    """Counts completed units of work and estimates the rate and the remaining time."""
+
+    def __init__(self, total):
+        """
+        Parameters
+        ----------
+        total
+            quantity of units of work
+        """
+        self.total = total
+        self.done = 0
+        self.start = time.perf_counter()
+
+    def update(self, n=1):
+        """Adds n completed units of work."""
+        self.done += n
+
+    def elapsed(self):
+        """Returns the seconds since the start."""
+        return time.perf_counter() - self.start
+
+    def fields(self, unit):
+        """Returns the progress as fields for an event.
+
+        Parameters
+        ----------
+        unit
+            name of the unit of work, used as prefix of the field names, e.g. "pages" or "files"
+
+        Returns
+        -------
+            dict with: units done, total units, units per second, elapsed seconds,
+            estimated remaining seconds (None as long as nothing is done)
+        """
+        elapsed = self.elapsed()
+        rate = self.done / elapsed if elapsed > 0 else 0
+
+        return {
+            f"{unit}_done": self.done,
+            f"{unit}_total": self.total,
+            f"{unit}_per_s": round(rate, 3),
+            "elapsed_s": round(elapsed, 2),
+            "eta_s": round((self.total - self.done) / rate, 1) if rate > 0 else None
+        }
+
+
+def write_summary(path, summary):
+    """Writes the summary of a run to a json file.
+
+    The file is replaced atomically, so a job scheduler never reads a partially written summary.
+
+    Parameters
+    ----------
+    path
+        path of the json file
+    summary
+        dict with the summary
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, default=str)
+
+    os.replace(tmp_path, path)
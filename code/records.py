@@ -9,6 +9,9 @@ import lines
 import group
 
 
+START_BRACKET_REGEX = re.compile("^[([{]") # indented lines starting with a bracket do not start a new record
+
+
 def extract_records(lines_df, start_indented=False):
     """Extracts the records based on the the labeled lines.
 
@@ -32,6 +35,9 @@ def extract_records(lines_df, start_indented=False):
 def merge_groups(lines_df):
     """Merges grouped lines and generates an index data frame.
 
+    The texts of all records are built with a single grouped join on the record number,
+    the country, region and page of a record are the ones of its first line.
+
     Parameters
     ----------
     lines_df
@@ -41,29 +47,16 @@ def merge_groups(lines_df):
     -------
         index data frame
     """    
-    df = lines_df.copy()
+    df = lines_df.loc[lines_df["record_no"]>-1]
 
-    texts = []
-    countries = []
-    regions = []
-    pages = []
-
-    for g, record in df.loc[df["record_no"]>-1].groupby("record_no"):
-
-        t = ""
-        for index, line in record.iterrows():
-            t = t + line["line_text"] + " "
-
-        texts.append(t)
-        countries.append(record.iloc[0]["country"])
-        regions.append(record.iloc[0]["region"])
-        pages.append(record.iloc[0]["page"])
+    texts = df.groupby("record_no", sort=True)["line_text"].agg(" ".join) + " "
+    first = df.loc[~df["record_no"].duplicated()].set_index("record_no").loc[texts.index]
 
     rec = pd.DataFrame({
-        "country": countries,
-        "region": regions,
-        "text": texts,
-        "page": pages
+        "country": list(first["country"]),
+        "region": list(first["region"]),
+        "text": list(texts),
+        "page": list(first["page"])
     })
 
     return rec
@@ -74,6 +67,7 @@ def group_records(lines_df, start_indented=False):
 
     Groups records based on the label start assigned to the lines (from start to next start).
     Lines are assigned a record_no. Lines with the same record_no form an record.
+    The lines are scanned once as plain lists, the columns are written at the end.
 
     Parameters
     ----------
@@ -88,38 +82,38 @@ def group_records(lines_df, start_indented=False):
     """    
     df = lines_df.copy()
 
-    df["country"] = ""
-    df["region"] = ""
-    df["record_no"] = -1
+    n = df.shape[0]
+    countries = [""] * n
+    regions = [""] * n
+    record_nos = [-1] * n
 
     cur_country = ""
     cur_region = ""
-    cur_index = []
     record_no = -1
     cur_no = -1
     label_col = "new_label"
     start_counter = 1
 
-    for index, row in df.iterrows():
+    for i, (label, text) in enumerate(zip(df[label_col].tolist(), df["line_text"].tolist())):
 
-        if row[label_col] == "country":
-            cur_country = row["line_text"]
+        if label == "country":
+            cur_country = text
             cur_region = ""
             cur_no = -1
             start_counter = 1
 
-        if row[label_col] == "region":
-            cur_region = row["line_text"]
+        if label == "region":
+            cur_region = text
             cur_no = -1
             start_counter = 1
 
         if not cur_country == "":
-            df.loc[index, "country"] = cur_country
-            df.loc[index, "region"] = cur_region
+            countries[i] = cur_country
+            regions[i] = cur_region
 
-            if row[label_col] == "start":
+            if label == "start":
                 if start_indented:         
-                    if (re.search("^[([{]", row["line_text"])==None) | (start_counter>3):
+                    if (START_BRACKET_REGEX.search(text)==None) | (start_counter>3):
                         start_counter = 1
                     if start_counter == 1:
                         record_no += 1
@@ -129,7 +123,10 @@ def group_records(lines_df, start_indented=False):
                     record_no +=  1
                 cur_no = record_no
 
-            if (cur_no > -1):
-                df.loc[index, "record_no"] = cur_no
+            record_nos[i] = cur_no
+
+    df["country"] = countries
+    df["region"] = regions
+    df["record_no"] = record_nos
 
     return df
@@ -2,21 +2,47 @@
 
 import fitz # PyMuPDF
 import os
+import hashlib
 import pytesseract
 import pandas as pd
-
-from pdf2image import convert_from_path
+import numpy as np
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+import progress
+
+OCR_DPI = 400
+OCR_CONFIG = f"--psm 4 --dpi {OCR_DPI}"
+
+TESS_FORMATS = ["csv", "feather", "parquet"] # supported file formats for tesseract data frames
+TESS_COLUMNS = ["page_num", "block_num", "par_num", "line_num", "left", "top", "width", "height", "text"] # columns used for the extraction
+TESS_DTYPES = {
+    "level": "int8",
+    "page_num": "int16",
+    "block_num": "int16",
+    "par_num": "int16",
+    "line_num": "int16",
+    "word_num": "int16",
+    "left": "int32",
+    "top": "int32",
+    "width": "int32",
+    "height": "int32",
+    "conf": "float32",
+    "text": "category"
+}
 
 
 def list_files(directory, suffix='', recursive=True):
-    """ Lists all files in directory (and its subdirectories) that end with suffix. 
+    """ Lists all files in directory (and its subdirectories) that end with suffix, see iter_files. 
 
     Parameters
     ----------
     directory
         path to directory that should be searched for files
     suffix, optional
-        suffix for the files, by default ''
+        suffix or tuple of suffixes for the files, by default ''
     recursive, optional
         defines if the path should be searched recursively, if type=int: how many
         levels of subdirectories should be searched, by default True
@@ -25,28 +51,65 @@ def list_files(directory, suffix='', recursive=True):
     -------
         list with path to files in directory
     """
-    files = []
-    dir_files = os.listdir(directory)
+    return list(iter_files(directory, suffix=suffix, recursive=recursive))
+
+
+def iter_files(directory, suffix='', recursive=True, exclude=None):
+    """Yields all files in directory (and its subdirectories) that end with suffix.
+
+    The directory tree is walked once with os.scandir, which gets the type of the entries from the
+    directory listing, so no extra stat call is needed for most entries. The paths are yielded while
+    the tree is walked, in the same order as os.listdir lists them, subdirectories are walked
+    where they appear in the listing.
+
+    Parameters
+    ----------
+    directory
+        path to directory that should be searched for files
+    suffix, optional
+        suffix or tuple of suffixes for the files, compared with the lower case file names, by default ''
+    recursive, optional
+        defines if the path should be searched recursively, if type=int: how many
+        levels of subdirectories should be searched, by default True
+    exclude, optional
+        subdirectories that are not searched, together with their subdirectories, by default None
+
+    Yields
+    ------
+        path to file
+    """
+    if isinstance(suffix, list):
+        suffix = tuple(suffix) # str.endswith only accepts tuples
+
+    if exclude != None:
+        exclude = {os.path.abspath(d) for d in exclude}
 
     rec = recursive
     if type(recursive) is int:
         rec = recursive-1
 
-    for f in dir_files:
-        cur_path = os.path.join(directory, f)
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            is_dir = entry.is_dir()
 
-        if ((recursive == True) | (recursive >= 1)) & os.path.isdir(cur_path):
-            sub_dir_files = list_files(cur_path, suffix, rec)
-            files = files + sub_dir_files
-        elif f.lower().endswith(suffix) & (not os.path.isdir(cur_path)):
-            files.append(cur_path)
+            if is_dir & (exclude != None):
+                if os.path.abspath(entry.path) in exclude:
+                    continue
 
-    return files
+            if ((recursive == True) | (recursive >= 1)) & is_dir:
+                yield from iter_files(entry.path, suffix, rec, exclude)
+            elif entry.name.lower().endswith(suffix) & (not is_dir):
+                yield entry.path
 
 
-def read_pdf(path, start_page=1, verbose=True):
+def read_pdf(path, start_page=1, verbose=True, end_page=None, dicts=False, workers=1):
     """Reads a pdf file with fitz.
 
+    Only the pages from start_page to end_page are read, see iter_pdf.
+    If workers is greater than 1, the page range is split into one shard per worker. Every worker
+    process opens the pdf itself and reads its shard, the pages are merged in page order,
+    so the result is the same as reading the pages one after another.
+
     Parameters
     ----------
     path
@@ -55,33 +118,126 @@ def read_pdf(path, start_page=1, verbose=True):
         page from which reading should start, by default 1
     verbose, optional
         print infos, by default True
+    end_page, optional
+        last page that should be read, if None: the last page of the pdf, by default None
+    dicts, optional
+        set True to also get the dictionaries of the pages, by default False
+    workers, optional
+        number of processes that read the pages in parallel, if None or smaller than 1: number of cpus, by default 1
 
     Returns
     -------
         list containing all pages and the words on that page with their coordinates,
-        list containing all pages and their corresponding dictionary
+        list containing all pages and their corresponding dictionary, None if dicts is False
     """
-    pdf_words = []
-    pdf_dicts = []
-
     if verbose:
         print("Reading pdf from", path)
         print("...")
 
-    with fitz.open(path) as pdf:
-        for page in pdf:
-            pdf_words.append(page.get_text("words"))
-            pdf_dicts.append(page.get_text('dict', flags=~fitz.TEXT_PRESERVE_IMAGES))
+    if workers == None:
+        workers = os.cpu_count()
+    if workers < 1:
+        workers = os.cpu_count()
+
+    shards = []
+    if workers > 1:
+        with fitz.open(path) as pdf:
+            end_page = pdf.page_count if end_page == None else min(end_page, pdf.page_count)
+
+        shards = [s for s in np.array_split(np.arange(start_page, end_page+1), workers) if s.shape[0] > 0]
+
+    if len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            shard_pages = executor.map(read_pdf_shard, [path] * len(shards), [int(s[0]) for s in shards], [int(s[-1]) for s in shards], [dicts] * len(shards))
+            pages = [p for shard in shard_pages for p in shard] # map keeps the order of the shards
+    else:
+        pages = list(iter_pdf(path, start_page=start_page, end_page=end_page, dicts=dicts))
+
+    if dicts:
+        pdf_words = [w for w, d in pages]
+        pdf_dicts = [d for w, d in pages]
+    else:
+        pdf_words = pages
+        pdf_dicts = None
 
     if verbose:
-        print("Finished reading", len(pdf_words)-(start_page-1), "page(s)")
+        print("Finished reading", len(pdf_words), "page(s)")
+
+    return pdf_words, pdf_dicts
 
-    return pdf_words[start_page-1:], pdf_dicts[start_page-1:]
+
+def iter_pdf(path, start_page=1, end_page=None, dicts=False):
+    """Reads the pages of a pdf file with fitz one after another.
+
+    Pages outside of the page range are not loaded. The dictionary of a page is only
+    extracted if it is asked for, it is much more expensive than the words.
+
+    Parameters
+    ----------
+    path
+        path to pdf fle
+    start_page, optional
+        page from which reading should start, by default 1
+    end_page, optional
+        last page that should be read, if None: the last page of the pdf, by default None
+    dicts, optional
+        set True to also get the dictionary of every page, by default False
+
+    Yields
+    ------
+        words on the page with their coordinates, if dicts is True: tuple of the words
+        and the dictionary of the page
+    """
+    with fitz.open(path) as pdf:
+        end_page = pdf.page_count if end_page == None else min(end_page, pdf.page_count)
+
+        for page_no in range(start_page-1, end_page):
+            page = pdf.load_page(page_no)
+            words = page.get_text("words")
+
+            if dicts:
+                yield words, page.get_text('dict', flags=~fitz.TEXT_PRESERVE_IMAGES)
+            else:
+                yield words
+
+
+def read_pdf_shard(path, start_page, end_page, dicts=False):
+    """Reads a shard of pages of a pdf file, used by read_pdf in the worker processes.
+
+    Parameters
+    ----------
+    path
+        path to pdf fle
+    start_page
+        first page of the shard
+    end_page
+        last page of the shard
+    dicts, optional
+        set True to also get the dictionaries of the pages, by default False
+
+    Returns
+    -------
+        list with the pages of the shard as yielded by iter_pdf
+    """
+    return list(iter_pdf(path, start_page=start_page, end_page=end_page, dicts=dicts))
 
 
-def ocr(file_path, start_page=1, verbose=True, save_to=None, tesseract_path=None):
+def ocr(file_path, start_page=1, verbose=True, save_to=None, tesseract_path=None, workers=None, cache_dir=None, file_format="csv", progress_log=None):
     """Uses tesseract for optical character recognition of the content of a pdf file.
 
+    The pages are recognized concurrently by a pool of workers, every worker runs its own
+    tesseract process. The data frames of the pages are concatenated once at the end.
+    Every worker converts only the page it is working on to an image, so at most one image
+    per worker is kept in memory, regardless of the length of the document.
+
+    If cache_dir is specified, the data frame of every page is cached there. The cache entries
+    are identified by the content hash of the pdf, the page number, the dpi, the tesseract version
+    and the tesseract config, so pages that have already been recognized with the same settings
+    are loaded from the cache instead of running tesseract again.
+
+    If progress_log is specified, an event is written when the ocr starts, when a page is done
+    (with pages per second and the estimated remaining time) and when the ocr is done.
+
     Parameters
     ----------
     file_path
@@ -94,6 +250,15 @@ def ocr(file_path, start_page=1, verbose=True, save_to=None, tesseract_path=None
         if specified: directory where the tesseract data frame should be saved to, by default None
     tesseract_path, optional
         define path to tesseract executable, by default None
+    workers, optional
+        number of pages that are recognized at the same time, if None or smaller than 1: number of cpus, by default None
+    cache_dir, optional
+        if specified: directory where the tesseract data frames of the pages are cached, by default None
+    file_format, optional
+        file format the tesseract data frame is saved in if save_to is specified, "csv", "feather" or "parquet",
+        by default "csv"
+    progress_log, optional
+        function that is called with the name and the fields of every progress event, e.g. progress.ProgressLog, by default None
 
     Returns
     -------
@@ -102,31 +267,60 @@ def ocr(file_path, start_page=1, verbose=True, save_to=None, tesseract_path=None
     if tesseract_path:
         pytesseract.pytesseract.tesseract_cmd = tesseract_path
 
-    if verbose:
-        print(f"Converting pdf pages for {file_path} to images.")
+    if workers == None:
+        workers = os.cpu_count()
+    if workers < 1:
+        workers = os.cpu_count()
+
+    page_nums = range(start_page, pdfinfo_from_path(file_path)["Pages"] + 1)
 
-    pdf_pages = convert_from_path(file_path, 400)[start_page-1:]
-    pdf_df = pd.DataFrame()
+    cache_paths = [None] * len(page_nums)
+    if cache_dir != None:
+        cache_paths = ocr_cache_paths(cache_dir, file_path, page_nums)
 
     if verbose:
-        print("Starting OCR...")
+        print(f"Starting OCR for {file_path}...")
 
-    for i, page_img in enumerate(pdf_pages):
-        df = pytesseract.image_to_data(page_img, config="--psm 4 --dpi 400", output_type="data.frame")
-        df["page_num"] = i + start_page
-        pdf_df = pd.concat([pdf_df, df])
+    page_func = ocr_page
+    if progress_log != None:
+        progress_log("ocr_started", file=file_path, pages_total=len(page_nums), workers=workers)
 
-        if verbose:
-            print(f"Done with page {i+start_page}")
+        throughput = progress.Throughput(len(page_nums))
+        lock = threading.Lock()
+
+        def page_func(file_path, page_num, verbose, cache_path):
+            df = ocr_page(file_path, page_num, verbose, cache_path)
+            with lock: # pages are finished by several threads
+                throughput.update()
+                progress_log("ocr_page_done", file=file_path, page=page_num, **throughput.fields("pages"))
+            return df
+
+    # one thread per tesseract process, the pages run in parallel instead, the environment is
+    # inherited by the tesseract processes and restored afterwards
+    omp_limit = os.environ.get("OMP_THREAD_LIMIT")
+    if (workers > 1) & (omp_limit == None):
+        os.environ["OMP_THREAD_LIMIT"] = "1"
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(page_func, [file_path] * len(page_nums), page_nums, [verbose] * len(page_nums), cache_paths))
+    finally:
+        if (workers > 1) & (omp_limit == None):
+            del os.environ["OMP_THREAD_LIMIT"]
+
+    pdf_df = pd.concat(frames) if frames else pd.DataFrame()
 
     if verbose:
-        print(f"OCR done for {i+1} pages.")
+        print(f"OCR done for {len(frames)} pages.")
+
+    if progress_log != None:
+        progress_log("ocr_done", file=file_path, **throughput.fields("pages"))
 
     if not save_to == None:
         if os.path.isdir(save_to):
 
-            save_path = os.path.join(save_to, os.path.basename(file_path).replace(".pdf", ".csv"))
-            pdf_df.to_csv(save_path, index=False)
+            save_path = os.path.join(save_to, os.path.basename(file_path).replace(".pdf", "." + file_format))
+            save_tess_df(pdf_df, save_path)
 
             if verbose:
                 print(f"Saved data frame to {save_path}.")
@@ -136,6 +330,255 @@ def ocr(file_path, start_page=1, verbose=True, save_to=None, tesseract_path=None
     return pdf_df
 
 
+def ocr_page(file_path, page_num, verbose=True, cache_path=None):
+    """Converts a single page of a pdf file to an image and uses tesseract for optical character recognition of it.
+
+    Parameters
+    ----------
+    file_path
+        path to pdf file
+    page_num
+        number of the page in the pdf
+    verbose, optional
+        print infos, by default True
+    cache_path, optional
+        if specified: path of the cache entry for this page, the entry is loaded if it exists,
+        else it is written after the ocr, by default None
+
+    Returns
+    -------
+        tesseract data frame of the page
+    """
+    if cache_path != None:
+        if os.path.isfile(cache_path):
+            if verbose:
+                print(f"Loaded page {page_num} from cache")
+
+            return pd.read_csv(cache_path)
+
+    page_img = convert_from_path(file_path, OCR_DPI, first_page=page_num, last_page=page_num)[0]
+    df = pytesseract.image_to_data(page_img, config=OCR_CONFIG, output_type="data.frame")
+    df["page_num"] = page_num
+
+    if cache_path != None:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp" # write to temporary file first, so no incomplete entries are left after a crash
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+
+    if verbose:
+        print(f"Done with page {page_num}")
+
+    return df
+
+
+def ocr_cache_paths(cache_dir, file_path, page_nums):
+    """Returns the paths of the ocr cache entries for pages of a pdf file.
+
+    The entries of a pdf are stored in a subdirectory named after the content hash of the pdf.
+    The file name of an entry consists of the page number and a hash of the ocr settings
+    (dpi, tesseract version, tesseract config).
+
+    Parameters
+    ----------
+    cache_dir
+        directory of the ocr cache
+    file_path
+        path to pdf file
+    page_nums
+        page numbers
+
+    Returns
+    -------
+        list with paths to the cache entries, one for every page
+
+    Raises
+    ------
+    ValueError
+        if cache_dir exists but is not a directory
+    """
+    if os.path.exists(cache_dir) & (not os.path.isdir(cache_dir)):
+        raise ValueError(f"{cache_dir} is not a directory.")
+
+    settings = f"{OCR_DPI}|{pytesseract.get_tesseract_version()}|{OCR_CONFIG}"
+    settings_hash = hashlib.sha256(settings.encode()).hexdigest()[:16]
+
+    pdf_dir = os.path.join(cache_dir, file_hash(file_path))
+    os.makedirs(pdf_dir, exist_ok=True)
+
+    return [os.path.join(pdf_dir, f"{p}_{settings_hash}.csv") for p in page_nums]
+
+
+def file_hash(path, chunk_size=1<<20):
+    """Calculates the sha256 hash of the content of a file.
+
+    Parameters
+    ----------
+    path
+        path to file
+    chunk_size, optional
+        size of the chunks the file is read in, by default 1 MiB
+
+    Returns
+    -------
+        hex digest of the hash
+    """
+    h = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def read_tess_df(path, start_page=1, words_only=True, chunksize=100000):
+    """Reads a tesseract data frame from a csv, feather or parquet file.
+
+    By default only the columns that are used for the extraction (TESS_COLUMNS) and only the rows
+    containing words on pages from start_page on are read. Csv files are read in chunks that
+    are filtered while reading, so the full file is never held in memory.
+
+    Parameters
+    ----------
+    path
+        path to the file
+    start_page, optional
+        page from which the rows should be kept, by default 1
+    words_only, optional
+        if True: only the columns used for the extraction and only rows with text are read,
+        if False: the complete data frame is read, by default True
+    chunksize, optional
+        number of rows of a csv file that are read at once, by default 100000
+
+    Returns
+    -------
+        tesseract data frame
+
+    Raises
+    ------
+    ValueError
+        if the file format is not supported
+    """
+    file_format = os.path.splitext(path)[1].lower().lstrip(".")
+    columns = TESS_COLUMNS if words_only else None
+
+    if file_format == "csv":
+        if not words_only:
+            return pd.read_csv(path, dtype={"text": str}) # words that are numbers are kept as str, as for the words only
+
+        chunks = pd.read_csv(path, usecols=columns, dtype={"text": str}, chunksize=chunksize)
+        return pd.concat([filter_tess_df(c, start_page) for c in chunks])
+    elif file_format == "feather":
+        df = pd.read_feather(path, columns=columns)
+    elif file_format == "parquet":
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        raise ValueError(f"{file_format} is not a supported file format for tesseract data frames.")
+
+    if words_only:
+        df = filter_tess_df(df, start_page)
+
+    return df
+
+
+def filter_tess_df(pdf_df, start_page=1):
+    """Removes the rows of a tesseract data frame that do not contain a word or are on a page before start_page.
+
+    Parameters
+    ----------
+    pdf_df
+        tesseract data frame
+    start_page, optional
+        page from which the rows should be kept, by default 1
+
+    Returns
+    -------
+        tesseract data frame
+    """
+    return pdf_df.loc[pdf_df["text"].notna() & (pdf_df["page_num"] >= start_page)]
+
+
+def save_tess_df(pdf_df, path):
+    """Saves a tesseract data frame as csv, feather or parquet file, depending on the suffix of path.
+
+    Feather and parquet files are saved with compact dtypes, see compact_tess_df.
+
+    Parameters
+    ----------
+    pdf_df
+        tesseract data frame
+    path
+        path to the file
+
+    Raises
+    ------
+    ValueError
+        if the file format is not supported
+    """
+    file_format = os.path.splitext(path)[1].lower().lstrip(".")
+
+    if file_format == "csv":
+        pdf_df.to_csv(path, index=False)
+    elif file_format == "feather":
+        compact_tess_df(pdf_df).reset_index(drop=True).to_feather(path)
+    elif file_format == "parquet":
+        compact_tess_df(pdf_df).to_parquet(path, index=False)
+    else:
+        raise ValueError(f"{file_format} is not a supported file format for tesseract data frames.")
+
+
+def compact_tess_df(pdf_df):
+    """Converts the columns of a tesseract data frame to compact dtypes.
+
+    Coordinates are stored as int32, the numbering of pages, blocks, paragraphs, lines and words
+    as int16 and the text as category.
+
+    Parameters
+    ----------
+    pdf_df
+        tesseract data frame
+
+    Returns
+    -------
+        tesseract data frame with compact dtypes
+    """
+    df = pdf_df.copy()
+
+    if "text" in df.columns:
+        df["text"] = df["text"].where(df["text"].isna(), df["text"].astype(str)) # numbers recognized as text are kept as str
+
+    return df.astype({c: t for c, t in TESS_DTYPES.items() if c in df.columns})
+
+
+def convert_tess_df(path, output_dir, file_format="feather", verbose=True):
+    """Converts a tesseract data frame saved as csv file to a feather or parquet file.
+
+    Parameters
+    ----------
+    path
+        path to the csv file
+    output_dir
+        directory where the converted file is written to
+    file_format, optional
+        "feather" or "parquet", by default "feather"
+    verbose, optional
+        print infos, by default True
+
+    Returns
+    -------
+        path to the converted file
+    """
+    f_name = os.path.splitext(os.path.basename(path))[0]
+    save_path = os.path.join(output_dir, f"{f_name}.{file_format}")
+
+    save_tess_df(read_tess_df(path, words_only=False), save_path)
+
+    if verbose:
+        print(f"Converted {path} to {save_path}.")
+
+    return save_path
+
+
 def flatten(t):
     """Flattens a list of lists to a single list.
 
@@ -169,3 +612,31 @@ def similar_to(a, b, d):
     if ((a+d>b) & (a-d<b)):
         return True
     return False
+
+
+def join_groups(values, keys, sep=" "):
+    """Joins the strings of consecutive rows with the same key.
+
+    Parameters
+    ----------
+    values
+        strings that should be joined
+    keys
+        key for every string, rows with the same key have to be next to each other
+    sep, optional
+        separator that is put between the joined strings, by default " "
+
+    Returns
+    -------
+        series with the joined strings, indexed by key
+    """
+    keys = np.asarray(keys)
+    values = list(values)
+
+    if len(keys) == 0:
+        return pd.Series([], dtype=object)
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+
+    return pd.Series([sep.join(values[s:e]) for s, e in zip(starts, ends)], index=keys[starts])
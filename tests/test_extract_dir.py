@@ -0,0 +1,155 @@
+"""Regression tests for extract.extract_indexes_dir with the output directory inside the input directory
+and for the incremental extraction of directories."""
+
+import os
+import shutil
+
+import pytest
+
+import extract
+import manifest
+import util
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESS_DF = os.path.join(ROOT_DIR, "tesseract_data_frames", "Afghanistan_LS_index_1935.csv")
+INDEX = os.path.join(ROOT_DIR, "extracted_indexes", "Afghanistan_LS_index_1935_tess.csv")
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    d = tmp_path / "in"
+    d.mkdir()
+    shutil.copy(TESS_DF, d / "index.csv")
+    return d
+
+
+def test_iter_files_exclude(input_dir):
+    (input_dir / "zz").mkdir()
+    (input_dir / "zz" / "out.csv").write_text("")
+
+    assert list(util.iter_files(str(input_dir), suffix=".csv", exclude=[str(input_dir / "zz")])) == [str(input_dir / "index.csv")]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_nested_output_dir(input_dir, jobs):
+    output_dir = input_dir / "zz"
+    output_dir.mkdir()
+    shutil.copy(INDEX, output_dir / "index_tess.csv") # output of an earlier run
+
+    failed = extract.extract_indexes_dir(str(input_dir), str(output_dir), recursive=True, verbose=False, jobs=jobs)
+
+    assert failed == []
+    assert os.listdir(output_dir) == ["index_tess.csv"]
+
+
+def test_output_dir_is_input_dir(input_dir):
+    failed = extract.extract_indexes_dir(str(input_dir), str(input_dir), verbose=False)
+
+    assert failed == []
+    assert sorted(os.listdir(input_dir)) == ["index.csv", "index_tess.csv"]
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """Records the files extract.extract_indexes_dir extracts."""
+    files = []
+    extract_file = extract.extract_indexes_batch_file
+
+    def extract_counted(path, **kwargs):
+        files.append(os.path.basename(path))
+        return extract_file(path, **kwargs)
+
+    monkeypatch.setattr(extract, "extract_indexes_batch_file", extract_counted)
+    return files
+
+
+def extract_incremental(input_dir, output_dir, **kwargs):
+    return extract.extract_indexes_dir(str(input_dir), str(output_dir), verbose=False, incremental=True, **kwargs)
+
+
+def test_incremental_second_run_skips(input_dir, tmp_path, extracted):
+    assert extract_incremental(input_dir, tmp_path) == []
+    assert extract_incremental(input_dir, tmp_path) == []
+
+    assert extracted == ["index.csv"]
+    assert manifest.load(str(tmp_path))["index.csv"]["rows"] > 0
+
+
+def test_incremental_touched_file_not_hashed(input_dir, tmp_path, extracted, monkeypatch):
+    extract_incremental(input_dir, tmp_path)
+    stat = os.stat(input_dir / "index.csv")
+    os.utime(input_dir / "index.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    hashed = []
+    file_hash = util.file_hash
+    monkeypatch.setattr(util, "file_hash", lambda path: hashed.append(path) or file_hash(path))
+
+    extract_incremental(input_dir, tmp_path) # same content, it is hashed once and the new modification time is recorded
+    extract_incremental(input_dir, tmp_path)
+
+    assert extracted == ["index.csv"]
+    assert len(hashed) == 1
+    assert manifest.load(str(tmp_path))["index.csv"]["mtime_ns"] == stat.st_mtime_ns + 10**9
+
+
+def test_incremental_changed_content(input_dir, tmp_path, extracted):
+    extract_incremental(input_dir, tmp_path)
+    stat = os.stat(input_dir / "index.csv")
+    with open(input_dir / "index.csv", "a") as f:
+        f.write("\n")
+    os.utime(input_dir / "index.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns)) # same modification time, different size
+
+    extract_incremental(input_dir, tmp_path)
+
+    assert extracted == ["index.csv", "index.csv"]
+
+
+def test_incremental_changed_settings(input_dir, tmp_path, extracted):
+    extract_incremental(input_dir, tmp_path)
+    extract_incremental(input_dir, tmp_path, remove_wrong=False)
+    extract_incremental(input_dir, tmp_path, remove_wrong=False)
+
+    assert extracted == ["index.csv", "index.csv"]
+    assert manifest.load(str(tmp_path))["index.csv"]["settings"]["remove_wrong"] == False
+
+
+def test_incremental_deleted_output(input_dir, tmp_path, extracted):
+    extract_incremental(input_dir, tmp_path)
+    os.remove(tmp_path / "index_tess.csv")
+
+    extract_incremental(input_dir, tmp_path)
+
+    assert extracted == ["index.csv", "index.csv"]
+    assert os.path.isfile(tmp_path / "index_tess.csv")
+
+
+def test_incremental_no_index(input_dir, tmp_path, monkeypatch):
+    extracted = []
+
+    def extract_no_index(path, **kwargs):
+        extracted.append(os.path.basename(path))
+        return {"rows": None, "duration": 0, "stages": {}} # no output file is written
+
+    monkeypatch.setattr(extract, "extract_indexes_batch_file", extract_no_index)
+    extract_incremental(input_dir, tmp_path)
+    extract_incremental(input_dir, tmp_path)
+
+    assert extracted == ["index.csv"]
+    assert manifest.load(str(tmp_path))["index.csv"]["rows"] == None
+
+
+def test_incremental_duplicate_output_name(input_dir, tmp_path, extracted):
+    (input_dir / "sub").mkdir()
+    shutil.copy(TESS_DF, input_dir / "sub" / "index.csv")
+
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    failed = extract_incremental(input_dir, output_dir, recursive=True)
+
+    assert len(failed) == 1 # only the second file found with the same output name fails
+    assert extracted == ["index.csv"]
+    entries = manifest.load(str(output_dir))
+    assert (len(entries) == 1) & (not os.path.relpath(failed[0], str(input_dir)) in entries)
+    assert sorted(os.listdir(output_dir)) == [manifest.MANIFEST_NAME, "index_tess.csv"]
@@ -0,0 +1,39 @@
+"""Round trip tests for tesseract data frames converted from csv to feather and parquet files."""
+
+import pytest
+
+import util
+
+
+TEXTS = ["1935", "1936", "007"]
+
+
+@pytest.fixture
+def tess_csv(tmp_path):
+    """Tesseract data frame where all words are numbers, so pandas would read the text as float."""
+    header = "level,page_num,block_num,par_num,line_num,word_num,left,top,width,height,conf,text\n"
+    rows = [
+        "1,1,0,0,0,0,0,0,2298,3671,-1.0,",
+        "5,1,1,1,1,1,100,200,80,30,95.0,1935",
+        "5,1,1,1,1,2,200,200,80,30,95.0,1936",
+        "5,1,1,1,2,1,100,250,60,30,95.0,007",
+    ]
+    path = tmp_path / "index.csv"
+    path.write_text(header + "\n".join(rows) + "\n")
+    return path
+
+
+def test_read_numeric_text(tess_csv):
+    assert util.read_tess_df(str(tess_csv))["text"].tolist() == TEXTS
+    assert util.read_tess_df(str(tess_csv), words_only=False)["text"].dropna().tolist() == TEXTS
+
+
+@pytest.mark.parametrize("file_format", ["feather", "parquet"])
+def test_convert_round_trip(tess_csv, tmp_path, file_format):
+    expected = util.read_tess_df(str(tess_csv))
+
+    converted = util.convert_tess_df(str(tess_csv), str(tmp_path), file_format=file_format, verbose=False)
+    df = util.read_tess_df(converted)
+
+    assert df["text"].astype(str).tolist() == TEXTS
+    assert df[util.TESS_COLUMNS[:-1]].values.tolist() == expected[util.TESS_COLUMNS[:-1]].values.tolist()